@@ -1,4 +1,5 @@
 import streamlit as st
+import profiler
 from datetime import date
 from db_dashboard import (
     get_open_tasks,
@@ -6,126 +7,157 @@ from db_dashboard import (
     get_sales_pipeline_data,
     get_insights_suggestions
 )
-from engines.task_engine import run_daily_task_generator
+from db import get_task_runs_for_date
+from engines.task_engine import prefetch_task_messages
+from engines.client_engine import start_summary_sweeper
+from components.task_message import task_message
 
 # --- Page setup ---
 st.set_page_config(page_title="Dashboard", page_icon="🏠", layout="wide")
-st.title("🏠 Furniture CRM 2.0 Dashboard")
-
-# --- Run the task engine automatically ---
-if "task_engine_ran" not in st.session_state:
-    run_daily_task_generator()
-    st.session_state.task_engine_ran = True
-
-# --- Add a Sale ---
-with st.expander("➕ Quick Add Sale"):
-    from components.sale_form import sale_entry_form
-    sale_entry_form()
-
-# --- Dashboard Layout ---
-col1, col2 = st.columns(2)
-
-# ---------------------------
-# 📋 Today's Tasks
-# ---------------------------
-with col1:
-    st.subheader("📋 Today's Tasks")
-
-    tasks = get_open_tasks(due_today=True)
-
-    if tasks:
-        for task in tasks:
-            with st.container():
-                st.markdown(f"**{task['description']}** — Due {task['due_date']}")
-                if task.get("message"):
-                    st.caption(f"💬 {task['message']}")
-                if st.button(f"✅ Mark Complete", key=f"complete_task_{task['id']}"):
-                    from db import complete_task
-                    complete_task(task["id"])
-                    st.success("Task completed!")
+with profiler.page("Dashboard"):
+    st.title("🏠 Furniture CRM 2.0 Dashboard")
+
+    start_summary_sweeper()
+
+    # --- Daily task generation status (tasks are generated by daily_task_job.py) ---
+    profiler.section("Daily task generation status")
+    task_runs = get_task_runs_for_date(date.today().isoformat())
+    if not task_runs:
+        st.caption("⏳ Today's follow-up tasks have not been generated yet.")
+    elif any(run["status"] != "done" for run in task_runs):
+        st.caption("⏳ Today's follow-up tasks are still being generated.")
+
+    # --- Add a Sale ---
+    profiler.section("Add a Sale")
+    with st.expander("➕ Quick Add Sale"):
+        from components.sale_form import sale_entry_form
+        sale_entry_form()
+
+    # --- Dashboard Layout ---
+    profiler.section("Dashboard Layout")
+    col1, col2 = st.columns(2)
+
+    # ---------------------------
+    # 📋 Today's Tasks
+    # ---------------------------
+    profiler.section("Today's Tasks")
+    with col1:
+        st.subheader("📋 Today's Tasks")
+
+        tasks = get_open_tasks(due_today=True)
+
+        # Draft today's messages in the background once per session
+        if "messages_prefetched" not in st.session_state:
+            prefetch_task_messages(tasks)
+            st.session_state.messages_prefetched = True
+
+        if len(tasks) > 1:
+            with st.form("dashboard_bulk_complete", clear_on_submit=True):
+                task_labels = {f"{t['description']} (#{t['id']})": t["id"] for t in tasks}
+                selected_labels = st.multiselect("Select tasks to mark done", list(task_labels.keys()))
+                if st.form_submit_button("✅ Mark Selected Done") and selected_labels:
+                    from db import complete_tasks
+                    done = complete_tasks(task_labels[label] for label in selected_labels)
+                    st.success(f"{done} tasks completed!")
                     st.rerun()
-    else:
-        st.success("🎉 No tasks due today!")
-
-    if st.button("📋 View All Tasks"):
-        st.switch_page("pages/2_Tasks.py")  # adjust the path as needed
-
-    # --- NEW: Follow-Up Tasks Section ---
-    st.subheader("✉️ Active Follow-Up Tasks")
-
-    # Pull tasks
-    from db import get_all_tasks, complete_task
-
-    tasks = get_all_tasks()
-    open_followup_tasks = [t for t in tasks if not t["completed"] and t.get("message")]
-
-    if open_followup_tasks:
-        for task in open_followup_tasks:
-            from db import get_client_by_id
-            client_info = get_client_by_id(task["client_id"])
-            client_name = client_info["name"] if client_info else "Unknown Client"
-
-            with st.container():
-                st.markdown(f"**{task['description']}** — {client_name} (Due {task['due_date']})")
-                st.caption(f"💬 {task['message']}")
-                if st.checkbox(f"Mark Done", key=f"followup_task_{task['id']}"):
-                    complete_task(task["id"])
-                    st.success("Task completed!")
-                    st.experimental_rerun()
-    else:
-        st.info("No active follow-up tasks right now.")
-
-# ---------------------------
-# 🛋️ Hot Clients
-# ---------------------------
-with col2:
-    st.subheader("🛋️ Hot Clients")
-
-    hot_clients = get_high_priority_clients()
-
-    if hot_clients:
-        for client in hot_clients:
-            with st.container():
-                st.markdown(f"**{client['name']}** — {client['lifecycle_stage']}")
-                st.caption(f"Next Action: {client.get('next_action', 'Follow up')}")
-                st.caption(f"Last Contact: {client.get('last_contact', 'Unknown')}")
-    else:
-        st.info("No high-priority clients right now.")
-
-    if st.button("👥 View All Clients"):
-        st.switch_page("pages/1_Clients.py")  # adjust the path as needed
-
-# ---------------------------
-# 📈 Sales Pipeline Snapshot
-# ---------------------------
-col3, col4 = st.columns(2)
-
-with col3:
-    st.subheader("📈 Sales Pipeline")
-
-    sales_data = get_sales_pipeline_data()
-
-    st.metric("Open Sales", sales_data["open"])
-    st.metric("Closed Sales", sales_data["closed"])
-    st.metric("Unsold Leads", sales_data["unsold"])
-    st.metric("Sales Volume (This Month)", f"${sales_data['total_volume']:,.2f}")
-
-    if st.button("📦 View Sales Report"):
-        st.switch_page("pages/3_Sales.py")  # adjust the path as needed
-
-# ---------------------------
-# 🧠 Insights & Suggestions
-# ---------------------------
-with col4:
-    st.subheader("🧠 Insights & Suggestions")
-
-    insights = get_insights_suggestions()
-
-    if insights:
-        for suggestion in insights:
-            st.markdown(f"✅ {suggestion}")
-    else:
-        st.info("No insights to suggest right now.")
-
-    if st.button("🧠 Go to Insights"):
-        st.switch_page("pages/4_Insights.py")  # future page if needed
\ No newline at end of file
+
+        if tasks:
+            for task in tasks:
+                with st.container():
+                    st.markdown(f"**{task['description']}** — Due {task['due_date']}")
+                    task_message(task, "today")
+                    if st.button(f"✅ Mark Complete", key=f"complete_task_{task['id']}"):
+                        from db import complete_task
+                        complete_task(task["id"])
+                        st.success("Task completed!")
+                        st.rerun()
+        else:
+            st.success("🎉 No tasks due today!")
+
+        if st.button("📋 View All Tasks"):
+            st.switch_page("pages/2_Tasks.py")  # adjust the path as needed
+
+        # --- NEW: Follow-Up Tasks Section ---
+        profiler.section("Follow-Up Tasks")
+        st.subheader("✉️ Active Follow-Up Tasks")
+
+        # Pull tasks
+        from db import get_open_tasks as get_all_open_tasks, complete_task
+
+        tasks = get_all_open_tasks()
+        open_followup_tasks = [t for t in tasks if t.get("message") or t.get("message_spec")]
+
+        if open_followup_tasks:
+            from db import get_client_names_by_ids
+            client_names = get_client_names_by_ids(t["client_id"] for t in open_followup_tasks)
+
+            for task in open_followup_tasks:
+                client_name = client_names.get(task["client_id"], "Unknown Client")
+
+                with st.container():
+                    st.markdown(f"**{task['description']}** — {client_name} (Due {task['due_date']})")
+                    task_message(task, "followup")
+                    if st.checkbox(f"Mark Done", key=f"followup_task_{task['id']}"):
+                        complete_task(task["id"])
+                        st.success("Task completed!")
+                        st.experimental_rerun()
+        else:
+            st.info("No active follow-up tasks right now.")
+
+    # ---------------------------
+    # 🛋️ Hot Clients
+    # ---------------------------
+    profiler.section("Hot Clients")
+    with col2:
+        st.subheader("🛋️ Hot Clients")
+
+        hot_clients = get_high_priority_clients()
+
+        if hot_clients:
+            for client in hot_clients:
+                with st.container():
+                    st.markdown(f"**{client['name']}** — {client['lifecycle_stage']}")
+                    st.caption(f"Next Action: {client.get('next_action', 'Follow up')}")
+                    st.caption(f"Last Contact: {client.get('last_contact', 'Unknown')}")
+        else:
+            st.info("No high-priority clients right now.")
+
+        if st.button("👥 View All Clients"):
+            st.switch_page("pages/1_Clients.py")  # adjust the path as needed
+
+    # ---------------------------
+    # 📈 Sales Pipeline Snapshot
+    # ---------------------------
+    profiler.section("Sales Pipeline Snapshot")
+    col3, col4 = st.columns(2)
+
+    with col3:
+        st.subheader("📈 Sales Pipeline")
+
+        sales_data = get_sales_pipeline_data()
+
+        st.metric("Open Sales", sales_data["open"])
+        st.metric("Closed Sales", sales_data["closed"])
+        st.metric("Unsold Leads", sales_data["unsold"])
+        st.metric("Sales Volume (This Month)", f"${sales_data['total_volume']:,.2f}")
+
+        if st.button("📦 View Sales Report"):
+            st.switch_page("pages/3_Sales.py")  # adjust the path as needed
+
+    # ---------------------------
+    # 🧠 Insights & Suggestions
+    # ---------------------------
+    profiler.section("Insights & Suggestions")
+    with col4:
+        st.subheader("🧠 Insights & Suggestions")
+
+        insights = get_insights_suggestions()
+
+        if insights:
+            for suggestion in insights:
+                st.markdown(f"✅ {suggestion}")
+        else:
+            st.info("No insights to suggest right now.")
+
+        if st.button("🧠 Go to Insights"):
+            st.switch_page("pages/4_Insights.py")  # future page if needed
@@ -1,13 +1,11 @@
-from openai import OpenAI
 import os
 import json
-import streamlit as st
 from templates.followups import FOLLOW_UP_MESSAGES
 from templates.followup_tones import FOLLOW_UP_TONES
+from engines import llm_gateway
+from engines.context_index import relevant_context, format_context, document_text
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
-def generate_layout_and_followup(sketch_data):
+def generate_layout_and_followup(sketch_data, use_cache=True):
     prompt = f"""
     A customer is furnishing a {sketch_data['room_type']}. Here are the details:
 
@@ -25,18 +23,25 @@ def generate_layout_and_followup(sketch_data):
     3. A follow-up message I can text or email the guest
     """
 
-    response = client.chat.completions.create(
-        model="gpt-4",
+    context = relevant_context(
+        sketch_data.get("client_id"),
+        document_text("sketches", sketch_data),
+        exclude={("sketches", sketch_data.get("id"))}
+    )
+    if context:
+        prompt += f"\n    Relevant notes about this guest:\n{format_context(context)}\n"
+
+    return llm_gateway.chat(
+        "ai_helper.generate_layout_and_followup",
         messages=[
             {"role": "system", "content": "You are an expert interior designer and sales consultant for high-end furniture."},
             {"role": "user", "content": prompt}
         ],
+        use_cache=use_cache,
         max_tokens=500
     )
 
-    return response.choices[0].message.content
-
-def generate_note_from_prompt(prompt, client_data, sketch_data):
+def generate_note_from_prompt(prompt, client_data, sketch_data, use_cache=True):
     name = client_data.get("name", "the client")
     room = sketch_data.get("room_type", "their space")
     style = client_data.get("style", "")
@@ -51,13 +56,14 @@ def generate_note_from_prompt(prompt, client_data, sketch_data):
         f"Special considerations: {special}."
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4",
+    content = llm_gateway.chat(
+        "ai_helper.generate_note_from_prompt",
         messages=[{"role": "user", "content": full_prompt}],
+        use_cache=use_cache,
         max_tokens=400
     )
 
-    return response.choices[0].message.content.strip()
+    return content.strip()
 
 def load_followup_templates():
     with open("templates/followups.json", "r") as f:
@@ -67,10 +73,7 @@ def get_followup_template(guest_type, style):
     templates = load_followup_templates()
     return templates.get(guest_type, {}).get(style)
 
-import streamlit as st
-from openai import OpenAI
-
-def generate_followup_from_template(client_type, message_style, client_data, sketch_data=None):
+def generate_followup_from_template(client_type, message_style, client_data, sketch_data=None, use_cache=True):
     sketch_data = sketch_data or {}
 
     template = FOLLOW_UP_MESSAGES.get(client_type, {}).get(message_style)
@@ -107,16 +110,15 @@ Notes: {sketch_data.get('layout_notes')}
 Write this in a personal, human tone, avoiding robotic or generic phrasing.
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4",
+    content = llm_gateway.chat(
+        "ai_helper.generate_followup_from_template",
         messages=[
             {"role": "system", "content": "You are a helpful assistant for a furniture sales company."},
             {"role": "user", "content": prompt}
         ],
+        use_cache=use_cache,
         max_tokens=400,
         temperature=0.8
     )
 
-    return response.choices[0].message.content.strip()
-
-
+    return content.strip()
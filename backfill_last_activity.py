@@ -0,0 +1,17 @@
+# backfill_last_activity.py
+# Fills clients.last_activity_at from existing notes, sketches, sales and tasks.
+#
+# Add the column first:
+#   alter table clients add column last_activity_at timestamptz;
+#
+# Usage (reads .streamlit/secrets.toml):
+#   python backfill_last_activity.py        # only clients with no value yet
+#   python backfill_last_activity.py --all  # recompute every client
+
+import sys
+from db import backfill_last_activity
+
+if __name__ == "__main__":
+    only_missing = "--all" not in sys.argv[1:]
+    updated = backfill_last_activity(only_missing=only_missing)
+    print(f"Updated last_activity_at for {updated} clients.")
@@ -0,0 +1,22 @@
+import streamlit as st
+from engines.task_engine import ensure_task_message, personalize_task_message
+
+def task_message(task, key_prefix, message=None):
+    """
+    Shows a task's follow-up message. Tasks created with only a message_spec get a
+    button that generates the message on first open and saves it to the task;
+    tasks with a template message get a button to have the LLM personalize it.
+    Pass message when the list was loaded without message bodies.
+    """
+    message = message or task.get("message")
+
+    if message:
+        message_area = st.empty()
+        message_area.caption(f"💬 {message}")
+        if task.get("message_spec") and st.button("✨ Personalize", key=f"{key_prefix}_personalize_{task['id']}"):
+            with st.spinner("Personalizing message..."):
+                message_area.caption(f"💬 {personalize_task_message(task)}")
+    elif task.get("message_spec"):
+        if st.button("💬 Draft Message", key=f"{key_prefix}_draft_{task['id']}"):
+            with st.spinner("Drafting message..."):
+                st.caption(f"💬 {ensure_task_message(task)}")
@@ -0,0 +1,135 @@
+# daily_task_job.py
+# Cron entry point for the daily follow-up task generator.
+#
+# Each (date, shard) run is recorded in task_generator_runs (see db.py). A finished
+# run is not repeated, and an interrupted one resumes after the last checkpointed client.
+#
+# Usage (reads .streamlit/secrets.toml):
+#   python daily_task_job.py                      # all active clients
+#   python daily_task_job.py --workers 4          # split the id range across 4 processes
+#   python daily_task_job.py --min-id 1 --max-id 5000
+#   python daily_task_job.py --force              # rerun even if today's run is done
+#   python daily_task_job.py --rebuild-schedule   # materialize the follow-up schedule for all clients first
+#   python daily_task_job.py --messages lazy      # LLM-write messages on first open instead of using templates
+#   python daily_task_job.py --messages llm       # LLM-write messages during the run (--eager-messages)
+
+import argparse
+from datetime import date, datetime
+import multiprocessing
+
+
+def shard_name(min_id=None, max_id=None):
+    if min_id is None and max_id is None:
+        return "all"
+    return f"{min_id if min_id is not None else ''}-{max_id if max_id is not None else ''}"
+
+
+def split_id_range(low, high, workers):
+    """
+    Splits [low, high] into `workers` contiguous, non-overlapping id ranges.
+    """
+    span = high - low + 1
+    step = -(-span // workers)  # ceiling division
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def run_job(min_id=None, max_id=None, force=False, message_tier="fast", workers=1):
+    from db import get_task_run, save_task_run
+    from engines.task_engine import run_daily_task_generator
+    from engines.llm_limits import OPENAI_LIMITER, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE
+
+    # Rate limits are enforced per process, so each worker gets an equal share of the account's
+    if workers > 1:
+        OPENAI_LIMITER.set_limits(REQUESTS_PER_MINUTE / workers, TOKENS_PER_MINUTE / workers)
+
+    run_date = date.today().isoformat()
+    shard = shard_name(min_id, max_id)
+    record = get_task_run(run_date, shard)
+
+    if record and record["status"] == "done" and not force:
+        print(f"[{shard}] Already done for {run_date} ({record.get('tasks_created', 0)} tasks). Skipping.")
+        return
+
+    resume_after = record.get("last_client_id") if record and not force else None
+    previously_written = (record.get("tasks_created") or 0) if record and not force else 0
+
+    save_task_run(
+        run_date, shard,
+        status="running",
+        last_client_id=resume_after,
+        tasks_created=previously_written,
+        started_at=datetime.utcnow().isoformat(),
+        finished_at=None
+    )
+    if resume_after is not None:
+        print(f"[{shard}] Resuming after client {resume_after}.")
+
+    def checkpoint(last_client_id, written):
+        save_task_run(run_date, shard, last_client_id=last_client_id, tasks_created=previously_written + written)
+
+    written = run_daily_task_generator(
+        min_id=min_id,
+        max_id=max_id,
+        resume_after=resume_after,
+        on_checkpoint=checkpoint,
+        message_tier=message_tier
+    )
+
+    save_task_run(
+        run_date, shard,
+        status="done",
+        tasks_created=previously_written + written,
+        finished_at=datetime.utcnow().isoformat()
+    )
+    print(f"[{shard}] Done: {written} tasks written.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate today's follow-up tasks.")
+    parser.add_argument("--min-id", type=int, help="Lowest client id to process")
+    parser.add_argument("--max-id", type=int, help="Highest client id to process")
+    parser.add_argument("--workers", type=int, default=1, help="Split the id range across this many processes")
+    parser.add_argument("--force", action="store_true", help="Run again even if today's run is recorded as done")
+    parser.add_argument("--rebuild-schedule", action="store_true", help="Rebuild the follow-up schedule from all sales before running")
+    parser.add_argument("--messages", choices=["fast", "lazy", "llm"], default="fast",
+                        help="fast: fill local templates; lazy: LLM on first open; llm: LLM during the run")
+    parser.add_argument("--eager-messages", action="store_const", const="llm", dest="messages", help="Same as --messages llm")
+    args = parser.parse_args()
+
+    if args.rebuild_schedule:
+        from engines.schedule_engine import rebuild_all_schedules
+        print(f"Rebuilt follow-up schedule for {rebuild_all_schedules()} clients.")
+
+    if args.workers <= 1:
+        run_job(args.min_id, args.max_id, args.force, args.messages)
+        return
+
+    from db import get_active_client_id_bounds
+
+    low, high = get_active_client_id_bounds()
+    if low is None:
+        print("No active clients.")
+        return
+    low = args.min_id if args.min_id is not None else low
+    high = args.max_id if args.max_id is not None else high
+
+    # Spawned, not forked: the parent has already opened database connections,
+    # and a forked worker would share their sockets.
+    context = multiprocessing.get_context("spawn")
+    ranges = split_id_range(low, high, args.workers)
+    workers = [
+        context.Process(target=run_job, args=(start, end, args.force, args.messages, len(ranges)))
+        for start, end in ranges
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    failed = [w for w in workers if w.exitcode != 0]
+    if failed:
+        raise SystemExit(f"{len(failed)} worker(s) failed; rerun to resume them.")
+
+
+if __name__ == "__main__":
+    main()
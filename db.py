@@ -2,11 +2,162 @@ from supabase import create_client
 from datetime import (datetime, date)
 import os
 import streamlit as st
+from db_cache import cached, invalidate, invalidate_table
+import db_mirror
 
 url = st.secrets["SUPABASE_URL"]
 key = st.secrets["SUPABASE_KEY"]
 supabase = create_client(url, key)
 
+# Serve reads from an in-process mirror kept current with updated_at delta pulls.
+USE_MIRROR = st.secrets.get("USE_LOCAL_MIRROR", False)
+if USE_MIRROR:
+    db_mirror.init(supabase)
+
+# Rows fetched per request when streaming a table. Kept below the PostgREST max-rows cap.
+PAGE_SIZE = 500
+# Ids per .in_() filter, so the request URL stays well under proxy length limits.
+IN_CHUNK_SIZE = 200
+
+# Named column projections for list rendering. Full rows ("*") are only needed on drill-down.
+VIEWS = {
+    "client_label": "id, name, phone",
+    "task_row": "id, client_id, sale_id, title, description, due_date, completed, message_spec",
+    "sale_row": "id, client_id, amount, status, date, notes"
+}
+
+def _columns(columns):
+    """
+    Resolves a view name from VIEWS or passes an explicit column list through.
+    """
+    return VIEWS.get(columns, columns)
+
+def _project(rows, columns):
+    """
+    Applies a column projection to rows already in memory (mirror reads).
+    """
+    columns = _columns(columns)
+    if columns == "*":
+        return rows
+    fields = [c.strip() for c in columns.split(",")]
+    return [{f: r.get(f) for f in fields} for r in rows]
+
+def _changed(table, *client_ids):
+    """
+    Called after a write: drops affected cache entries and flags the mirror table for a delta pull.
+    """
+    invalidate(table, *client_ids)
+    db_mirror.mark_dirty(table)
+
+def _changed_table(table):
+    invalidate_table(table)
+    db_mirror.mark_dirty(table)
+
+def _chunks(ids, size=IN_CHUNK_SIZE):
+    """
+    Splits a list of ids into slices of at most `size` for .in_() filters.
+    """
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+def _touch_clients(*client_ids):
+    """
+    Bumps clients.last_activity_at for every client whose history just changed,
+    so summary freshness checks can read one column instead of scanning history.
+    """
+    ids = list({cid for cid in client_ids if cid})
+    if not ids:
+        return
+    now = datetime.utcnow().isoformat()
+    supabase.table("clients").update({"last_activity_at": now}).in_("id", ids).execute()
+    _changed("clients", *ids)
+
+# ----------------------------
+# KEYSET PAGINATION
+# ----------------------------
+
+def _quote(value):
+    """
+    Quotes a value for use inside a PostgREST or=(...) filter.
+    """
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+def _keyset_condition(order_by, op, desc, last_value, last_id):
+    """
+    Builds the or=(...) filter selecting rows after the cursor. Postgres sorts
+    nulls last ascending and first descending, so null values are handled explicitly.
+    """
+    same_value_tail = f"id.{op}.{last_id}"
+    if last_value is None:
+        if desc:
+            return f"{order_by}.not.is.null,and({order_by}.is.null,{same_value_tail})"
+        return f"and({order_by}.is.null,{same_value_tail})"
+
+    value = _quote(last_value)
+    condition = f"{order_by}.{op}.{value},and({order_by}.eq.{value},{same_value_tail})"
+    if not desc:
+        condition += f",{order_by}.is.null"
+    return condition
+
+def _keyset_pages(table, columns="*", order_by="id", desc=False, page_size=PAGE_SIZE, after=None, filters=None):
+    """
+    Yields pages (lists of rows) from a table using keyset pagination.
+    Rows are ordered by order_by with id as a tie-breaker; the cursor is the
+    (order_by value, id) pair of the last row seen, so each page is an indexed
+    range scan instead of an OFFSET. filters is a list of (method, column, value)
+    tuples such as ("eq", "completed", False).
+    """
+    columns = _columns(columns)
+    if columns != "*":
+        needed = {"id", order_by} - {c.strip() for c in columns.split(",")}
+        if needed:
+            columns = ", ".join([columns] + sorted(needed))
+
+    op = "lt" if desc else "gt"
+    cursor = after
+
+    while True:
+        query = supabase.table(table).select(columns)
+        for method, column, value in filters or []:
+            query = getattr(query, method)(column, value)
+
+        if cursor is not None:
+            last_value, last_id = cursor
+            if order_by == "id":
+                query = getattr(query, op)("id", last_id)
+            else:
+                query = query.or_(_keyset_condition(order_by, op, desc, last_value, last_id))
+
+        query = query.order(order_by, desc=desc)
+        if order_by != "id":
+            query = query.order("id", desc=desc)
+
+        rows = query.limit(page_size).execute().data or []
+        if not rows:
+            return
+
+        yield rows
+
+        if len(rows) < page_size:
+            return
+        cursor = (rows[-1].get(order_by), rows[-1]["id"])
+
+def _page(table, columns="*", order_by="id", desc=False, page_size=50, after=None, filters=None):
+    """
+    Returns one window of rows and the cursor for the next window (None when exhausted).
+    """
+    pages = _keyset_pages(table, columns, order_by, desc, page_size, after, filters)
+    rows = next(pages, [])
+    next_cursor = (rows[-1].get(order_by), rows[-1]["id"]) if len(rows) == page_size else None
+    return rows, next_cursor
+
+def iter_rows(table, columns="*", order_by="id", desc=False, page_size=PAGE_SIZE, filters=None):
+    """
+    Streams every matching row of a table, one page at a time.
+    """
+    for rows in _keyset_pages(table, columns, order_by, desc, page_size, filters=filters):
+        yield from rows
+
 # ----------------------------
 # CLIENTS
 # ----------------------------
@@ -24,11 +175,30 @@ def add_client(name, phone, email, address, rooms, style, budget, status):
         "budget": budget,
         "status": status
     }).execute()
+    _changed("clients")
     return response
 
-def get_all_clients_with_ids():
-    response = supabase.table("clients").select("*").order("id", desc=False).execute()
-    return response.data
+@cached("clients")
+def get_all_clients_with_ids(columns="*"):
+    """
+    Pulls all clients ordered by id. Pass columns="client_label" for pickers.
+    """
+    if USE_MIRROR:
+        return _project(_sorted_rows(db_mirror.rows("clients"), "id"), columns)
+    return list(iter_all_clients(columns=columns))
+
+def iter_all_clients(page_size=PAGE_SIZE, columns="*"):
+    """
+    Streams all clients ordered by id without loading the whole table at once.
+    """
+    return iter_rows("clients", columns=columns, page_size=page_size)
+
+@cached("clients")
+def get_clients_page(after=None, page_size=50, columns="*"):
+    """
+    Returns (clients, next_cursor) for one window of clients ordered by id.
+    """
+    return _page("clients", columns=columns, page_size=page_size, after=after)
 
 def update_client(client_id, name, phone, email, address, rooms, style, budget, status):
     supabase.table("clients").update({
@@ -39,19 +209,74 @@ def update_client(client_id, name, phone, email, address, rooms, style, budget,
         "rooms": rooms,
         "style": style,
         "budget": budget,
-        "status": status
+        "status": status,
+        "last_activity_at": datetime.utcnow().isoformat()
     }).eq("id", client_id).execute()
+    _changed("clients", client_id)
 
+@cached("clients", per_client=True)
 def get_client_by_id(client_id):
+    if USE_MIRROR:
+        return db_mirror.get("clients", client_id)
     result = supabase.table("clients").select("*").eq("id", client_id).single().execute()
     return result.data
 
+def get_clients_by_ids(client_ids, columns="*"):
+    """
+    Fetches many clients in one query. Returns a dict of client_id -> client row,
+    so list pages can resolve names for every row without a lookup per row.
+    """
+    ids = list({cid for cid in client_ids if cid is not None})
+    if not ids:
+        return {}
+
+    columns = _columns(columns)
+    if columns != "*" and "id" not in [c.strip() for c in columns.split(",")]:
+        columns = f"id, {columns}"
+
+    clients = {}
+    for chunk in _chunks(ids):
+        result = supabase.table("clients").select(columns).in_("id", chunk).execute()
+        clients.update({c["id"]: c for c in (result.data or [])})
+    return clients
+
+def search_clients(term, limit=25, columns="client_label"):
+    """
+    Server-side client search: case-insensitive match on name, or on phone digits
+    regardless of formatting. A pg_trgm GIN index on clients.name and clients.phone
+    keeps these ilike scans fast.
+    """
+    term = (term or "").strip()
+    if not term:
+        return []
+
+    conditions = [f"name.ilike.{_quote('*' + term + '*')}"]
+    digits = "".join(ch for ch in term if ch.isdigit())
+    if len(digits) >= 3:
+        # Wildcards between digits let "5551234" match "(555) 123-4"
+        conditions.append(f"phone.ilike.*{'*'.join(digits)}*")
+
+    result = supabase.table("clients") \
+        .select(_columns(columns)) \
+        .or_(",".join(conditions)) \
+        .order("name") \
+        .limit(limit) \
+        .execute()
+    return result.data or []
+
+def get_client_names_by_ids(client_ids):
+    """
+    Returns a dict of client_id -> client name for the given ids, using a single query.
+    """
+    clients = get_clients_by_ids(client_ids, columns="id, name")
+    return {cid: c.get("name") for cid, c in clients.items()}
+
 # ----------------------------
 # ROOM SKETCHES
 # ----------------------------
 
 def add_room_sketch(client_id, room_type, dimensions, layout_notes, current_furniture, desired_furniture, special_considerations):
-    supabase.table("room_sketches").insert({
+    result = supabase.table("room_sketches").insert({
         "client_id": client_id,
         "room_type": room_type,
         "dimensions": dimensions,
@@ -60,68 +285,149 @@ def add_room_sketch(client_id, room_type, dimensions, layout_notes, current_furn
         "desired_furniture": desired_furniture,
         "special_considerations": special_considerations
     }).execute()
+    _changed("room_sketches", client_id)
+    _touch_clients(client_id)
+    _index_context("sketches", result.data)
+
+def get_room_sketch_by_id(sketch_id):
+    result = supabase.table("room_sketches").select("*").eq("id", sketch_id).limit(1).execute()
+    return result.data[0] if result.data else None
 
+@cached("room_sketches", per_client=True)
 def get_room_sketches_by_client(client_id):
+    if USE_MIRROR:
+        return _sorted_rows(db_mirror.rows("room_sketches", client_id=client_id), "id")
     response = supabase.table("room_sketches").select("*").eq("client_id", client_id).order("id", desc=False).execute()
     return response.data
 
+def _rows_by_clients(table, client_ids, order_by, desc=False):
+    """
+    Fetches a table's rows for many clients, one query per id chunk. Returns a
+    dict of client_id -> rows ordered like the per-client getter; clients
+    without rows are left out.
+    """
+    ids = list({cid for cid in client_ids if cid is not None})
+    if USE_MIRROR:
+        rows = [r for cid in ids for r in db_mirror.rows(table, client_id=cid)]
+    else:
+        rows = []
+        for chunk in _chunks(ids):
+            rows += supabase.table(table).select("*").in_("client_id", chunk).execute().data or []
+
+    grouped = {}
+    for row in _sorted_rows(rows, order_by, desc=desc):
+        grouped.setdefault(row["client_id"], []).append(row)
+    return grouped
+
+def get_room_sketches_by_clients(client_ids):
+    """
+    Room sketches for many clients at once: client_id -> sketches, oldest first.
+    """
+    return _rows_by_clients("room_sketches", client_ids, "id")
+
 # ----------------------------
 # NOTES
 # ----------------------------
 
+def _index_context(kind, rows, removed_ids=()):
+    """
+    Keeps the prompt context index current with notes and sketches just written.
+    """
+    from engines.context_index import get_context_index
+    index = get_context_index()
+    for row_id in removed_ids:
+        index.remove(kind, row_id)
+    index.add(kind, rows or [])
+
 def add_note(client_id, note_type, content):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    supabase.table("client_notes").insert({
+    result = supabase.table("client_notes").insert({
         "client_id": client_id,
         "timestamp": timestamp,
         "type": note_type,
         "content": content
     }).execute()
+    _changed("client_notes", client_id)
+    _touch_clients(client_id)
+    _index_context("notes", result.data)
+
+def get_notes_by_clients(client_ids):
+    """
+    Notes for many clients at once: client_id -> notes, newest first.
+    """
+    return _rows_by_clients("client_notes", client_ids, "timestamp", desc=True)
 
+@cached("client_notes", per_client=True)
 def get_notes_by_client(client_id):
+    if USE_MIRROR:
+        return _sorted_rows(db_mirror.rows("client_notes", client_id=client_id), "timestamp", desc=True)
     response = supabase.table("client_notes").select("*").eq("client_id", client_id).order("timestamp", desc=True).execute()
     return response.data
 
 def update_note(note_id, new_content):
-    supabase.table("client_notes").update({
+    result = supabase.table("client_notes").update({
         "content": new_content
     }).eq("id", note_id).execute()
+    client_ids = [n["client_id"] for n in result.data or []]
+    _changed("client_notes", *client_ids)
+    _touch_clients(*client_ids)
+    _index_context("notes", result.data)
 
 def delete_note(note_id):
-    supabase.table("client_notes").delete().eq("id", note_id).execute()
-
+    result = supabase.table("client_notes").delete().eq("id", note_id).execute()
+    db_mirror.discard("client_notes", note_id)
+    client_ids = [n["client_id"] for n in result.data or []]
+    _changed("client_notes", *client_ids)
+    _touch_clients(*client_ids)
+    _index_context("notes", [], removed_ids=[note_id])
+
+@cached("sales", per_client=True)
 def get_sales_by_client(client_id):
+    if USE_MIRROR:
+        return _sorted_rows(db_mirror.rows("sales", client_id=client_id), "date", desc=True)
     response = supabase.table("sales").select("*").eq("client_id", client_id).order("date", desc=True).execute()
     return response.data
 
 def update_sale(sale_id, amount, status, notes):
-    supabase.table("sales").update({
+    result = supabase.table("sales").update({
         "amount": amount,
         "status": status,
         "notes": notes
     }).eq("id", sale_id).execute()
+    client_ids = [s["client_id"] for s in result.data or []]
+    _changed("sales", *client_ids)
+    _touch_clients(*client_ids)
+    _schedule_followups(*client_ids)
 
 def void_sale(sale_id):
-    supabase.table("sales").update({
+    result = supabase.table("sales").update({
         "status": "Void"
     }).eq("id", sale_id).execute()
+    client_ids = [s["client_id"] for s in result.data or []]
+    _changed("sales", *client_ids)
+    _touch_clients(*client_ids)
+    _schedule_followups(*client_ids)
 
+@cached("sales", per_client=True)
 def get_total_sales_volume_by_client(client_id):
     result = supabase.table("sales").select("amount").eq("client_id", client_id).eq("status", "Sold").execute()
     amounts = [s["amount"] for s in result.data if s["amount"] is not None]
     return round(sum(amounts), 2)
 
+@cached("sales", per_client=True)
 def get_average_sale_by_client(client_id):
     result = supabase.table("sales").select("amount").eq("client_id", client_id).eq("status", "Sold").execute()
     amounts = [s["amount"] for s in result.data if s["amount"] is not None]
     return round(sum(amounts) / len(amounts), 2) if amounts else 0.0
 
+@cached("sales", per_client=True)
 def get_first_sale_date_by_client(client_id):
     result = supabase.table("sales").select("date").eq("client_id", client_id).eq("status", "Sold").order("date", desc=False).limit(1).execute()
     if result.data:
         return result.data[0]["date"]
     return None
 
+@cached("sales", per_client=True)
 def get_average_days_between_sales(client_id):
     result = supabase.table("sales").select("date").eq("client_id", client_id).eq("status", "Sold").order("date", desc=False).execute()
     dates = [datetime.strptime(s["date"], "%Y-%m-%d") for s in result.data if s.get("date")]
@@ -148,17 +454,64 @@ def add_task(client_id, description, due_date, title=None, message=None, sale_id
         task_data["sale_id"] = sale_id
 
     supabase.table("tasks").insert(task_data).execute()
+    _changed("tasks", client_id)
+    _touch_clients(client_id)
+
+# Natural key used to deduplicate generated tasks. Backed in the database by:
+#   alter table tasks add constraint tasks_natural_key
+#       unique nulls not distinct (client_id, sale_id, description, due_date);
+TASK_KEY_COLUMNS = "client_id,sale_id,description,due_date"
+UPSERT_CHUNK_SIZE = 500
+
+def task_key(task):
+    """
+    Returns the (client_id, sale_id, description, due_date) key of a task row.
+    """
+    return (task.get("client_id"), task.get("sale_id"), task.get("description"), task.get("due_date"))
+
+def add_tasks(tasks):
+    """
+    Bulk-inserts tasks (dicts with client_id, description, due_date and optional
+    title, message, message_spec, sale_id). Rows that already exist under the
+    natural key are skipped by the database, so reruns are safe. Returns the
+    number of rows sent.
+    """
+    rows = [{
+        "client_id": t["client_id"],
+        "description": t["description"],
+        "due_date": t["due_date"],
+        "completed": False,
+        "title": t.get("title") or t["description"][:50],
+        "message": t.get("message"),
+        "message_spec": t.get("message_spec"),
+        "sale_id": t.get("sale_id")
+    } for t in tasks]
+
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        supabase.table("tasks") \
+            .upsert(rows[start:start + UPSERT_CHUNK_SIZE], on_conflict=TASK_KEY_COLUMNS, ignore_duplicates=True) \
+            .execute()
+
+    if rows:
+        client_ids = {r["client_id"] for r in rows}
+        _changed("tasks", *client_ids)
+        _touch_clients(*client_ids)
+    return len(rows)
 
 # Get all tasks by specific client
-def get_tasks_by_client(client_id):
+@cached("tasks", per_client=True)
+def get_tasks_by_client(client_id, columns="*"):
+    if USE_MIRROR:
+        return _project(_sorted_rows(db_mirror.rows("tasks", client_id=client_id), "due_date"), columns)
     result = supabase.table("tasks") \
-        .select("*") \
+        .select(_columns(columns)) \
         .eq("client_id", client_id) \
         .order("due_date") \
         .execute()
     return result.data if result.data else []
 
 # Get all tasks due on a specific date
+@cached("tasks")
 def get_tasks_by_date(due_date):
     result = supabase.table("tasks").select("*").eq("due_date", due_date).execute()
     return result.data if result.data else []
@@ -168,52 +521,230 @@ def complete_task(task_id):
     """
     Marks a task as completed and updates the related client's last_contact timestamp.
     """
-    # First, fetch the task to get the client_id
-    task_response = supabase.table("tasks").select("*").eq("id", task_id).single().execute()
-    task = task_response.data
-
-    if not task:
-        return False
+    return complete_tasks([task_id]) > 0
 
-    client_id = task.get("client_id")
+def complete_tasks(task_ids):
+    """
+    Marks many tasks as completed and bumps last_contact for every affected client.
+    Uses two set-based updates regardless of how many tasks are passed.
+    Returns the number of tasks completed.
+    """
+    ids = list({tid for tid in task_ids if tid is not None})
+    if not ids:
+        return 0
 
-    # Mark the task as completed
-    supabase.table("tasks").update({"completed": True}).eq("id", task_id).execute()
+    # Mark the tasks as completed; the updated rows come back with their client_id
+    result = supabase.table("tasks").update({"completed": True}).in_("id", ids).execute()
+    completed = result.data or []
 
-    # Update client's last_contact to now
-    if client_id:
-        from datetime import datetime
+    # Update every affected client's last_contact and last_activity_at to now
+    client_ids = list({t["client_id"] for t in completed if t.get("client_id")})
+    if client_ids:
         now = datetime.utcnow().isoformat()
-        supabase.table("clients").update({"last_contact": now}).eq("id", client_id).execute()
+        supabase.table("clients").update({"last_contact": now, "last_activity_at": now}).in_("id", client_ids).execute()
+        _changed("clients", *client_ids)
 
-    return True
+    _changed("tasks", *client_ids)
+    return len(completed)
 
-def get_open_tasks():
-    result = supabase.table("tasks") \
-        .select("*") \
-        .eq("completed", False) \
-        .order("due_date") \
-        .execute()
-    return result.data if result.data else []
+@cached("tasks")
+def get_open_tasks(columns="*"):
+    if USE_MIRROR:
+        return _project(_sorted_rows(db_mirror.rows("tasks", completed=False), "due_date"), columns)
+    return list(iter_rows("tasks", columns=columns, order_by="due_date", filters=[("eq", "completed", False)]))
 
-def get_overdue_tasks():
+@cached("tasks")
+def get_overdue_tasks(columns="*"):
     today = date.today().isoformat()
-    result = supabase.table("tasks") \
-        .select("*") \
-        .lt("due_date", today) \
-        .eq("completed", False) \
-        .order("due_date") \
-        .execute()
-    return result.data if result.data else []
+    if USE_MIRROR:
+        overdue = [t for t in db_mirror.rows("tasks", completed=False) if t.get("due_date") and t["due_date"] < today]
+        return _project(_sorted_rows(overdue, "due_date"), columns)
+    filters = [("lt", "due_date", today), ("eq", "completed", False)]
+    return list(iter_rows("tasks", columns=columns, order_by="due_date", filters=filters))
+
+# Tasks created in lazy mode carry a message_spec instead of text:
+#   alter table tasks add column message_spec jsonb;
+def save_task_message(task_id, message, overwrite=False):
+    """
+    Stores a lazily generated message on a task, unless another session already
+    stored one (pass overwrite=True to replace it). Returns the message now on the task.
+    """
+    query = supabase.table("tasks").update({"message": message}).eq("id", task_id)
+    if not overwrite:
+        query = query.is_("message", "null")
+    result = query.execute()
+
+    if not result.data:
+        existing = supabase.table("tasks").select("client_id, message").eq("id", task_id).limit(1).execute().data
+        if existing:
+            _changed("tasks", existing[0]["client_id"])
+            return existing[0]["message"] or message
+        return message
+
+    _changed("tasks", result.data[0]["client_id"])
+    return message
+
+def get_task_messages(task_ids):
+    """
+    Fetches the message body for the given tasks only. Used on drill-down when
+    lists were loaded with the task_row view.
+    """
+    ids = list({tid for tid in task_ids if tid is not None})
+    if not ids:
+        return {}
+
+    messages = {}
+    for chunk in _chunks(ids):
+        result = supabase.table("tasks").select("id, message").in_("id", chunk).execute()
+        messages.update({t["id"]: t.get("message") for t in (result.data or [])})
+    return messages
 
+@cached("clients")
 def get_active_clients():
-    result = supabase.table("clients") \
-        .select("*") \
-        .eq("status", "Active") \
-        .order("name") \
+    if USE_MIRROR:
+        return _sorted_rows(db_mirror.rows("clients", status="Active"), "name")
+    return list(iter_rows("clients", order_by="name", filters=[("eq", "status", "Active")]))
+
+def get_active_client_id_bounds():
+    """
+    Returns (lowest, highest) active client id, or (None, None) if there are none.
+    """
+    def edge(desc):
+        result = supabase.table("clients").select("id").eq("status", "Active").order("id", desc=desc).limit(1).execute()
+        return result.data[0]["id"] if result.data else None
+    return edge(False), edge(True)
+
+# ----------------------------
+# TASK GENERATOR RUNS
+# ----------------------------
+# One row per (run_date, shard):
+#   create table task_generator_runs (
+#       run_date date not null,
+#       shard text not null,
+#       status text not null,          -- running | done
+#       last_client_id bigint,
+#       tasks_created integer default 0,
+#       started_at timestamptz,
+#       finished_at timestamptz,
+#       primary key (run_date, shard)
+#   );
+
+def get_task_run(run_date, shard="all"):
+    result = supabase.table("task_generator_runs").select("*") \
+        .eq("run_date", run_date).eq("shard", shard).limit(1).execute()
+    return result.data[0] if result.data else None
+
+def get_task_runs_for_date(run_date):
+    result = supabase.table("task_generator_runs").select("*").eq("run_date", run_date).execute()
+    return result.data or []
+
+def save_task_run(run_date, shard="all", **fields):
+    """
+    Creates or updates the run record for (run_date, shard).
+    """
+    supabase.table("task_generator_runs") \
+        .upsert({"run_date": run_date, "shard": shard, **fields}, on_conflict="run_date,shard") \
         .execute()
-    return result.data if result.data else []
 
+# ----------------------------
+# FOLLOW-UP SCHEDULE
+# ----------------------------
+# Materialized follow-up plan occurrences, rebuilt whenever a client's sales change:
+#   create table followup_schedule (
+#       id bigserial primary key,
+#       client_id bigint not null,
+#       sale_id bigint,
+#       plan_type text not null,
+#       step int not null,
+#       description text not null,
+#       due_date date not null,
+#       emitted_at timestamptz,
+#       unique nulls not distinct (client_id, sale_id, plan_type, step, due_date)
+#   );
+#   create index followup_schedule_due on followup_schedule (client_id, id)
+#       where emitted_at is null;
+# Rows are keyed on the plan step, not the description, so editing a sale does not
+# make an emitted follow-up look new. The sale amount is added when the task is built.
+# Tables created with the old description key:
+#   alter table followup_schedule add column step int;
+#   alter table followup_schedule drop constraint followup_schedule_client_id_sale_id_description_due_date_key;
+#   delete from followup_schedule where emitted_at is null;
+#   -- backfill step on emitted rows from FOLLOW_UP_PLANS, then run daily_task_job.py --rebuild-schedule
+#   alter table followup_schedule alter column step set not null,
+#       add constraint followup_schedule_step_key
+#       unique nulls not distinct (client_id, sale_id, plan_type, step, due_date);
+SCHEDULE_KEY_COLUMNS = "client_id,sale_id,plan_type,step,due_date"
+
+def schedule_key(row):
+    """
+    Returns the (client_id, sale_id, plan_type, step, due_date) key of a schedule row.
+    """
+    return (row.get("client_id"), row.get("sale_id"), row.get("plan_type"), row.get("step"), row.get("due_date"))
+
+def _schedule_followups(*client_ids):
+    """
+    Rebuilds the follow-up schedule for clients whose sales just changed.
+    """
+    from engines.schedule_engine import refresh_followup_schedule
+    for client_id in {cid for cid in client_ids if cid}:
+        refresh_followup_schedule(client_id)
+
+def replace_followup_schedule(client_id, occurrences, insert_from=None):
+    """
+    Brings a client's pending (not yet emitted) schedule in line with occurrences.
+    Pending entries that no longer match an occurrence, because their sale or
+    plan step is gone, are deleted; the rest are kept even when past due so
+    the generator can still emit them. New occurrences are added if they were
+    not already emitted and are due on or after insert_from (ISO date).
+    Returns the number of pending entries stored.
+    """
+    wanted = {schedule_key(o): o for o in occurrences}
+
+    existing = supabase.table("followup_schedule") \
+        .select(f"id, emitted_at, {SCHEDULE_KEY_COLUMNS}") \
+        .eq("client_id", client_id) \
+        .execute().data or []
+    pending = [row for row in existing if row.get("emitted_at") is None]
+    known_keys = {schedule_key(row) for row in existing}
+
+    stale_ids = [row["id"] for row in pending if schedule_key(row) not in wanted]
+    for chunk in _chunks(stale_ids):
+        supabase.table("followup_schedule").delete().in_("id", chunk).execute()
+
+    rows = [
+        o for key, o in wanted.items()
+        if key not in known_keys and (insert_from is None or o["due_date"] >= insert_from)
+    ]
+    if rows:
+        supabase.table("followup_schedule") \
+            .upsert(rows, on_conflict=SCHEDULE_KEY_COLUMNS, ignore_duplicates=True) \
+            .execute()
+    return len(pending) - len(stale_ids) + len(rows)
+
+def iter_due_followups(as_of, min_client_id=None, max_client_id=None, after_client_id=None, page_size=PAGE_SIZE):
+    """
+    Streams schedule entries due on or before as_of that have not been emitted,
+    ordered by client. Days the generator did not run are picked up automatically.
+    """
+    filters = [("lte", "due_date", as_of), ("is_", "emitted_at", "null")]
+    if min_client_id is not None:
+        filters.append(("gte", "client_id", min_client_id))
+    if max_client_id is not None:
+        filters.append(("lte", "client_id", max_client_id))
+    if after_client_id is not None:
+        filters.append(("gt", "client_id", after_client_id))
+    return iter_rows("followup_schedule", order_by="client_id", page_size=page_size, filters=filters)
+
+def mark_followups_emitted(schedule_ids):
+    ids = list({sid for sid in schedule_ids if sid is not None})
+    now = datetime.utcnow().isoformat()
+    for chunk in _chunks(ids):
+        supabase.table("followup_schedule") \
+            .update({"emitted_at": now}) \
+            .in_("id", chunk) \
+            .execute()
+
+@cached("tasks", per_client=True)
 def get_last_task_date(client_id):
     result = supabase.table("tasks") \
         .select("due_date") \
@@ -249,46 +780,95 @@ def get_client_id(name=None, phone=None):
         return data[0]["id"]
     return None
 
-def update_client_summary(client_id, summary_text):
-    supabase.table("clients").update({
-        "client_summary": summary_text,
-        "summary_last_updated": datetime.utcnow().isoformat()
-    }).eq("id", client_id).execute()
+# Incremental summaries record when the summary was last rebuilt from full history:
+#   alter table clients add column summary_rebuilt_at timestamptz;
+def update_client_summary(client_id, summary_text, full_rebuild=True, as_of=None):
+    """
+    Stores a summary. as_of (ISO UTC timestamp) is when the history it was
+    written from was read; activity after that still counts as new next time.
+    """
+    as_of = as_of or datetime.utcnow().isoformat()
+    fields = {"client_summary": summary_text, "summary_last_updated": as_of}
+    if full_rebuild:
+        fields["summary_rebuilt_at"] = as_of
+    supabase.table("clients").update(fields).eq("id", client_id).execute()
+    _changed("clients", client_id)
 
 
-def compute_client_last_modified(client_id):
+def get_clients_active_since(since, columns="id, last_activity_at, summary_last_updated"):
+    """
+    Clients whose last_activity_at is at or after `since` (ISO timestamp).
+    """
+    return list(iter_rows("clients", columns=columns, filters=[("gte", "last_activity_at", since)]))
+
+def summary_is_stale(client, last_modified=None):
+    """
+    True when a client has no summary, or activity newer than the summary.
+    client_summary is only checked when it was selected.
+    """
+    last_modified = last_modified or client.get("last_activity_at")
+    summary_last_updated = client.get("summary_last_updated")
+    return (
+        ("client_summary" in client and not client["client_summary"]) or
+        not summary_last_updated or
+        bool(last_modified and summary_last_updated < last_modified)
+    )
+
+def compute_client_last_modified(client_id, bundle=None):
+    """
+    Returns the client's last activity timestamp. Reads the maintained
+    last_activity_at column (from the bundle if one is passed), and only falls
+    back to scanning history for clients that have not been backfilled yet.
+    """
+    if bundle is not None:
+        client = bundle.get("client")
+    else:
+        client = get_client_last_activity(client_id)
+
+    if client and client.get("last_activity_at"):
+        return client["last_activity_at"]
+
+    if bundle is None:
+        bundle = get_client_bundle(client_id)
+    return _latest_activity(bundle)
+
+@cached("clients", per_client=True)
+def get_client_last_activity(client_id):
+    """
+    Single-column read of a client's last_activity_at.
+    """
+    result = supabase.table("clients").select("id, last_activity_at").eq("id", client_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+def _latest_activity(bundle):
     """
     Calculate the latest modification timestamp for a client based on client info, notes, sketches, sales, and tasks.
     """
 
-    # 1. Pull client core info
-    client = get_client_by_id(client_id)
+    # 1. Client core info
+    client = bundle.get("client")
     timestamps = []
 
     if client and client.get("updated_at"):
         timestamps.append(client["updated_at"])
 
-    # 2. Pull notes timestamps
-    notes = get_notes_by_client(client_id)
-    for note in notes:
+    # 2. Notes timestamps
+    for note in bundle.get("notes", []):
         if note.get("timestamp"):
             timestamps.append(note["timestamp"])
 
-    # 3. Pull sketches timestamps
-    sketches = get_room_sketches_by_client(client_id)
-    for sketch in sketches:
+    # 3. Sketches timestamps
+    for sketch in bundle.get("sketches", []):
         if sketch.get("created_at"):
             timestamps.append(sketch["created_at"])
 
-    # 4. Pull sales timestamps
-    sales = get_sales_by_client(client_id)
-    for sale in sales:
+    # 4. Sales timestamps
+    for sale in bundle.get("sales", []):
         if sale.get("date"):
             timestamps.append(sale["date"])
 
-    # 5. Pull tasks timestamps
-    tasks = get_tasks_by_client(client_id)
-    for task in tasks:
+    # 5. Tasks timestamps
+    for task in bundle.get("tasks", []):
         if task.get("due_date"):
             timestamps.append(task["due_date"])
 
@@ -310,23 +890,86 @@ def compute_client_last_modified(client_id):
     latest_timestamp = max(datetime_stamps)
     return latest_timestamp.isoformat()
 
-def get_all_tasks():
+def backfill_last_activity(only_missing=True):
+    """
+    Computes last_activity_at from full history for existing clients and stores it.
+    Returns the number of clients updated.
+    """
+    filters = [("is_", "last_activity_at", "null")] if only_missing else None
+    client_ids = [c["id"] for c in iter_rows("clients", columns="id", filters=filters)]
+
+    updated = 0
+    for client_id in client_ids:
+        latest = _latest_activity(get_client_bundle(client_id))
+        if latest:
+            supabase.table("clients").update({"last_activity_at": latest}).eq("id", client_id).execute()
+            _changed("clients", client_id)
+            updated += 1
+    return updated
+
+@cached("tasks")
+def get_all_tasks(columns="*"):
+    """
+    Pulls all tasks from the database, page by page so nothing is cut off at the row cap.
+    """
+    if USE_MIRROR:
+        return _project(_sorted_rows(db_mirror.rows("tasks"), "due_date"), columns)
+    return list(iter_all_tasks(columns=columns))
+
+def iter_all_tasks(page_size=PAGE_SIZE, completed=None, columns="*"):
+    """
+    Streams tasks ordered by due date. Pass completed=True/False to filter.
+    """
+    filters = [("eq", "completed", completed)] if completed is not None else None
+    return iter_rows("tasks", columns=columns, order_by="due_date", page_size=page_size, filters=filters)
+
+@cached("tasks")
+def get_tasks_page(after=None, page_size=50, completed=None, desc=False, columns="*"):
+    """
+    Returns (tasks, next_cursor) for one window of tasks ordered by due date.
+    Pass the returned cursor back as after= to fetch the next window.
+    """
+    filters = [("eq", "completed", completed)] if completed is not None else None
+    return _page("tasks", columns=columns, order_by="due_date", desc=desc, page_size=page_size, after=after, filters=filters)
+
+@cached("sales")
+def get_all_sales(columns="*"):
+    """
+    Pulls all sales records from the database, page by page so nothing is cut off at the row cap.
+    """
+    if USE_MIRROR:
+        return _project(_sorted_rows(db_mirror.rows("sales"), "id"), columns)
+    return list(iter_all_sales(columns=columns))
+
+def get_sales_by_ids(sale_ids, columns="*"):
+    """
+    Fetches many sales in one query per id chunk. Returns a dict of sale_id -> sale row.
+    """
+    ids = list({sid for sid in sale_ids if sid is not None})
+    columns = _columns(columns)
+    if columns != "*" and "id" not in [c.strip() for c in columns.split(",")]:
+        columns = f"id, {columns}"
+
+    sales = {}
+    for chunk in _chunks(ids):
+        result = supabase.table("sales").select(columns).in_("id", chunk).execute()
+        sales.update({s["id"]: s for s in (result.data or [])})
+    return sales
+
+def iter_all_sales(page_size=PAGE_SIZE, status=None, columns="*"):
     """
-    Pulls all tasks from the database.
+    Streams sales ordered by id. Pass status= to filter.
     """
-    response = supabase.table("tasks").select("*").execute()
-    if response.data:
-        return response.data
-    return []
+    filters = [("eq", "status", status)] if status else None
+    return iter_rows("sales", columns=columns, page_size=page_size, filters=filters)
 
-def get_all_sales():
+@cached("sales")
+def get_sales_page(after=None, page_size=50, status=None, columns="*"):
     """
-    Pulls all sales records from the database.
+    Returns (sales, next_cursor) for one window of sales ordered by id.
     """
-    response = supabase.table("sales").select("*").execute()
-    if response.data:
-        return response.data
-    return []
+    filters = [("eq", "status", status)] if status else None
+    return _page("sales", columns=columns, page_size=page_size, after=after, filters=filters)
 
 def update_last_contact(client_id):
     """
@@ -336,6 +979,7 @@ def update_last_contact(client_id):
     now = datetime.utcnow().isoformat()
 
     supabase.table("clients").update({"last_contact": now}).eq("id", client_id).execute()
+    _changed("clients", client_id)
 
 def add_sale(client_id, amount, status, sale_date, notes=""):
     """
@@ -349,6 +993,64 @@ def add_sale(client_id, amount, status, sale_date, notes=""):
         "notes": notes
     }
     supabase.table("sales").insert(sale_data).execute()
+    _changed("sales", client_id)
+    _touch_clients(client_id)
+    _schedule_followups(client_id)
+
+# ----------------------------
+# CLIENT BUNDLE
+# ----------------------------
+
+# Embedded resources pulled alongside the client row in a single PostgREST request.
+CLIENT_BUNDLE_SELECT = "*, room_sketches(*), client_notes(*), sales(*), tasks(*)"
+
+def _sorted_rows(rows, field, desc=False):
+    """
+    Sorts embedded rows by field, keeping rows with a null value at the end.
+    """
+    rows = rows or []
+    present = sorted((r for r in rows if r.get(field) is not None), key=lambda r: r[field], reverse=desc)
+    missing = [r for r in rows if r.get(field) is None]
+    return present + missing
+
+@cached("clients", "room_sketches", "client_notes", "sales", "tasks", per_client=True)
+def get_client_bundle(client_id):
+    """
+    Fetches a client and all related sketches, notes, sales, and tasks in one roundtrip
+    using PostgREST embedded resources. Related rows are ordered the same way as the
+    per-table getters (get_room_sketches_by_client, get_notes_by_client, ...).
+    """
+    if USE_MIRROR:
+        return {
+            "client": get_client_by_id(client_id),
+            "sketches": get_room_sketches_by_client(client_id),
+            "notes": get_notes_by_client(client_id),
+            "sales": get_sales_by_client(client_id),
+            "tasks": get_tasks_by_client(client_id)
+        }
+
+    result = supabase.table("clients") \
+        .select(CLIENT_BUNDLE_SELECT) \
+        .eq("id", client_id) \
+        .limit(1) \
+        .execute()
+
+    if not result.data:
+        return {"client": None, "sketches": [], "notes": [], "sales": [], "tasks": []}
+
+    client = dict(result.data[0])
+    sketches = client.pop("room_sketches", None)
+    notes = client.pop("client_notes", None)
+    sales = client.pop("sales", None)
+    tasks = client.pop("tasks", None)
+
+    return {
+        "client": client,
+        "sketches": _sorted_rows(sketches, "id"),
+        "notes": _sorted_rows(notes, "timestamp", desc=True),
+        "sales": _sorted_rows(sales, "date", desc=True),
+        "tasks": _sorted_rows(tasks, "due_date")
+    }
 
 def gather_client_history(client_id):
     """
@@ -356,18 +1058,14 @@ def gather_client_history(client_id):
     Useful for generating AI summaries and smarter follow-ups.
     """
 
-    client_info = get_client_by_id(client_id)
-    sketches = get_room_sketches_by_client(client_id)
-    notes = get_notes_by_client(client_id)
-    sales = get_sales_by_client(client_id)
-    tasks = get_tasks_by_client(client_id)
+    bundle = get_client_bundle(client_id)
 
     history = {
-        "info": client_info,
-        "sketches": sketches,
-        "notes": notes,
-        "sales": sales,
-        "tasks": tasks
+        "info": bundle["client"],
+        "sketches": bundle["sketches"],
+        "notes": bundle["notes"],
+        "sales": bundle["sales"],
+        "tasks": bundle["tasks"]
     }
 
     return history
@@ -384,15 +1082,21 @@ def safe_fetch_client_data(selected_id):
             "client_last_modified": None
         }
 
-    from engines.client_engine import gather_client_history
+    # One roundtrip, shared across rendering, history, and summary freshness
+    bundle = get_client_bundle(selected_id)
 
     return {
-        "client_data": get_client_by_id(selected_id),
-        "sketches": get_room_sketches_by_client(selected_id),
-        "notes": get_notes_by_client(selected_id),
-        "sales": get_sales_by_client(selected_id),
-        "tasks": get_tasks_by_client(selected_id),
-        "full_history": gather_client_history(selected_id),
-        "client_last_modified": compute_client_last_modified(selected_id)
+        "client_data": bundle["client"],
+        "sketches": bundle["sketches"],
+        "notes": bundle["notes"],
+        "sales": bundle["sales"],
+        "tasks": bundle["tasks"],
+        "full_history": {
+            "client": bundle["client"],
+            "sales": bundle["sales"],
+            "tasks": bundle["tasks"],
+            "notes": bundle["notes"],
+            "sketches": bundle["sketches"]
+        },
+        "client_last_modified": compute_client_last_modified(selected_id, bundle=bundle)
     }
-
@@ -0,0 +1,132 @@
+# db_async.py
+# Awaitable versions of the hot db.py reads, for fanning independent queries out concurrently.
+
+import asyncio
+import contextvars
+from supabase import acreate_client
+import streamlit as st
+
+url = st.secrets["SUPABASE_URL"]
+key = st.secrets["SUPABASE_KEY"]
+
+# Maximum number of clients whose histories are fetched at the same time.
+MAX_CONCURRENT_CLIENTS = 8
+# Rows fetched per request when reading a whole table, as db.PAGE_SIZE.
+PAGE_SIZE = 500
+
+HISTORY_PARTS = ["client", "sales", "tasks", "notes", "sketches"]
+
+# The async client is bound to the event loop it was created on. run() opens one
+# per call and closes it when the coroutine finishes; tasks inherit it from the context.
+_client = contextvars.ContextVar("db_async_client", default=None)
+
+
+async def _db():
+    db = _client.get()
+    if db is None:
+        db = await acreate_client(url, key)
+        _client.set(db)
+    return db
+
+
+async def _with_client(coro):
+    db = await acreate_client(url, key)
+    _client.set(db)
+    try:
+        return await coro
+    finally:
+        await db.postgrest.aclose()
+
+
+def run(coro):
+    """
+    Runs a coroutine from synchronous code (page scripts, the task engine),
+    on a client that is opened for this call and closed after it.
+    """
+    return asyncio.run(_with_client(coro))
+
+# ----------------------------
+# READS
+# ----------------------------
+
+async def get_client_by_id(client_id):
+    db = await _db()
+    result = await db.table("clients").select("*").eq("id", client_id).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
+async def get_room_sketches_by_client(client_id):
+    db = await _db()
+    result = await db.table("room_sketches").select("*").eq("client_id", client_id).order("id", desc=False).execute()
+    return result.data or []
+
+
+async def get_notes_by_client(client_id):
+    db = await _db()
+    result = await db.table("client_notes").select("*").eq("client_id", client_id).order("timestamp", desc=True).execute()
+    return result.data or []
+
+
+async def get_sales_by_client(client_id):
+    db = await _db()
+    result = await db.table("sales").select("*").eq("client_id", client_id).order("date", desc=True).execute()
+    return result.data or []
+
+
+async def get_tasks_by_client(client_id):
+    db = await _db()
+    result = await db.table("tasks").select("*").eq("client_id", client_id).order("due_date").execute()
+    return result.data or []
+
+
+async def get_active_clients(page_size=PAGE_SIZE):
+    """
+    Active clients ordered by name. Reads in id-keyed pages, as db.iter_rows
+    does, so the result is not cut off at the PostgREST max-rows cap.
+    """
+    db = await _db()
+    clients = []
+    last_id = None
+    while True:
+        query = db.table("clients").select("*").eq("status", "Active")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await query.order("id").limit(page_size).execute()).data or []
+        clients += rows
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+    return sorted(clients, key=lambda c: c.get("name") or "")
+
+_PART_READERS = {
+    "client": get_client_by_id,
+    "sales": get_sales_by_client,
+    "tasks": get_tasks_by_client,
+    "notes": get_notes_by_client,
+    "sketches": get_room_sketches_by_client
+}
+
+
+async def gather_client_history(client_id, parts=HISTORY_PARTS):
+    """
+    Fetches the requested parts of a client's history concurrently, so the
+    call takes as long as the slowest query instead of the sum of all five.
+    Returns the same shape as engines.client_engine.gather_client_history.
+    """
+    results = await asyncio.gather(*(_PART_READERS[part](client_id) for part in parts))
+    return dict(zip(parts, results))
+
+
+async def gather_client_histories(client_ids, parts=HISTORY_PARTS, concurrency=MAX_CONCURRENT_CLIENTS):
+    """
+    Fetches histories for many clients, at most `concurrency` clients at a time.
+    Returns a dict of client_id -> history.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(client_id):
+        async with semaphore:
+            return client_id, await gather_client_history(client_id, parts)
+
+    pairs = await asyncio.gather(*(fetch(cid) for cid in client_ids))
+    return dict(pairs)
@@ -0,0 +1,135 @@
+# db_cache.py
+# Read-through cache for the db module: per-table TTLs, bounded LRU, tag-based invalidation.
+
+from collections import OrderedDict
+from functools import wraps
+import threading
+import time
+
+# Seconds each table's reads stay fresh. Writers invalidate earlier.
+CACHE_TTLS = {
+    "clients": 300,
+    "room_sketches": 300,
+    "client_notes": 120,
+    "sales": 120,
+    "tasks": 60
+}
+DEFAULT_TTL = 60
+MAX_ENTRIES = 512
+
+_lock = threading.RLock()
+_entries = OrderedDict()  # key -> (expires_at, tags, value)
+_stats = {}  # function name -> {"hits": n, "misses": n}
+_evictions = 0
+
+
+def _ttl_for(tables):
+    return min(CACHE_TTLS.get(t, DEFAULT_TTL) for t in tables)
+
+
+def _record(name, outcome):
+    counters = _stats.setdefault(name, {"hits": 0, "misses": 0})
+    counters[outcome] += 1
+
+
+def _store(key, tags, ttl, value):
+    global _evictions
+    _entries[key] = (time.monotonic() + ttl, tags, value)
+    _entries.move_to_end(key)
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+        _evictions += 1
+
+
+def cached(*tables, per_client=False):
+    """
+    Caches a db read function. Entries are tagged with the tables they read from.
+    With per_client=True the first argument is treated as the client id, so writes
+    for one client only drop that client's entries.
+
+    Cached values are shared between callers and must not be mutated.
+    """
+    def decorator(func):
+        name = func.__name__
+        ttl = _ttl_for(tables)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                hash(key)
+            except TypeError:
+                return func(*args, **kwargs)  # unhashable arguments, skip the cache
+
+            with _lock:
+                entry = _entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    _entries.move_to_end(key)
+                    _record(name, "hits")
+                    return entry[2]
+                _record(name, "misses")
+
+            value = func(*args, **kwargs)
+
+            if per_client and args:
+                tags = frozenset(f"{t}:{args[0]}" for t in tables)
+            else:
+                tags = frozenset(tables)
+
+            with _lock:
+                _store(key, tags, ttl, value)
+            return value
+
+        return wrapper
+    return decorator
+
+
+def invalidate(table, *client_ids):
+    """
+    Drops table-wide entries for table, plus per-client entries for the given client ids.
+    """
+    targets = {table} | {f"{table}:{cid}" for cid in client_ids}
+    with _lock:
+        for key in [k for k, (_, tags, _) in _entries.items() if tags & targets]:
+            del _entries[key]
+
+
+def invalidate_table(table):
+    """
+    Drops every entry that reads from table, for all clients.
+    Used by writers that only know a row id, not the owning client.
+    """
+    prefix = f"{table}:"
+    with _lock:
+        for key in [k for k, (_, tags, _) in _entries.items()
+                    if any(t == table or t.startswith(prefix) for t in tags)]:
+            del _entries[key]
+
+
+def clear():
+    """
+    Empties the cache and resets the counters.
+    """
+    global _evictions
+    with _lock:
+        _entries.clear()
+        _stats.clear()
+        _evictions = 0
+
+
+def cache_stats():
+    """
+    Returns hit/miss counters per function and in total, plus current size and evictions.
+    """
+    with _lock:
+        hits = sum(s["hits"] for s in _stats.values())
+        misses = sum(s["misses"] for s in _stats.values())
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 3) if total else 0.0,
+            "size": len(_entries),
+            "evictions": _evictions,
+            "functions": {name: dict(counters) for name, counters in _stats.items()}
+        }
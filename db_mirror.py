@@ -0,0 +1,227 @@
+# db_mirror.py
+# In-process mirror of the CRM tables, kept current with updated_at delta pulls.
+#
+# Every mirrored table needs an updated_at timestamptz column that is bumped on
+# insert and update (e.g. a "moddatetime" trigger in Supabase).
+
+from datetime import datetime, timedelta
+import threading
+import time
+
+MIRRORED_TABLES = ["clients", "tasks", "sales", "client_notes", "room_sketches"]
+
+# Seconds between "anything new?" checks for a table when nothing local has written to it.
+SYNC_INTERVAL = 15
+# Seconds between id-only scans that drop rows deleted by other sessions.
+RECONCILE_INTERVAL = 600
+# Rows whose updated_at is this close to the watermark are pulled again, to catch
+# transactions that committed late with an earlier timestamp.
+WATERMARK_OVERLAP = timedelta(seconds=5)
+SYNC_PAGE_SIZE = 1000
+
+_client = None
+_lock = threading.RLock()
+_tables = {}
+
+
+def _new_table():
+    return {
+        "rows": {},  # id -> row
+        "by_client": {},  # client_id -> set of ids
+        "watermark": None,  # max updated_at seen, as a string
+        "last_sync": 0.0,
+        "last_reconcile": 0.0,
+        "dirty": True,
+        "sync_lock": threading.Lock()  # one puller per table; held across network calls instead of _lock
+    }
+
+
+def init(client):
+    """
+    Attaches the Supabase client the mirror pulls from. Call once at startup.
+    """
+    global _client
+    with _lock:
+        _client = client
+        for table in MIRRORED_TABLES:
+            _tables.setdefault(table, _new_table())
+
+
+def _index(state, row):
+    old = state["rows"].get(row["id"])
+    if old is not None and old.get("client_id") != row.get("client_id"):
+        state["by_client"].get(old.get("client_id"), set()).discard(row["id"])
+    state["rows"][row["id"]] = row
+    if "client_id" in row:
+        state["by_client"].setdefault(row["client_id"], set()).add(row["id"])
+
+
+def _drop(state, row_id):
+    row = state["rows"].pop(row_id, None)
+    if row is not None:
+        state["by_client"].get(row.get("client_id"), set()).discard(row_id)
+
+
+def _since(watermark):
+    try:
+        return (datetime.fromisoformat(watermark) - WATERMARK_OVERLAP).isoformat()
+    except (TypeError, ValueError):
+        return watermark
+
+
+def _pull_changes(table, state, since):
+    """
+    Pulls rows changed since `since`, one page at a time. The requests run
+    without _lock; it is only taken to merge each page. Returns the number of
+    rows applied.
+    """
+    applied = 0
+    last_id = None
+
+    while True:
+        query = _client.table(table).select("*")
+        if since:
+            query = query.gte("updated_at", since)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(SYNC_PAGE_SIZE).execute().data or []
+
+        with _lock:
+            for row in rows:
+                _index(state, row)
+                stamp = row.get("updated_at")
+                if stamp and (state["watermark"] is None or stamp > state["watermark"]):
+                    state["watermark"] = stamp
+        applied += len(rows)
+
+        if len(rows) < SYNC_PAGE_SIZE:
+            return applied
+        last_id = rows[-1]["id"]
+
+
+def _reconcile(table, state):
+    """
+    Drops mirrored rows that no longer exist upstream, using an id-only scan.
+    Only rows mirrored before the scan started are considered.
+    """
+    with _lock:
+        known_ids = set(state["rows"])
+
+    live_ids = set()
+    last_id = None
+    while True:
+        query = _client.table(table).select("id")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(SYNC_PAGE_SIZE).execute().data or []
+        live_ids.update(r["id"] for r in rows)
+        if len(rows) < SYNC_PAGE_SIZE:
+            break
+        last_id = rows[-1]["id"]
+
+    with _lock:
+        for row_id in known_ids - live_ids:
+            _drop(state, row_id)
+
+
+def sync(table, force=False):
+    """
+    Brings one table up to date. Skips the network entirely if the table was
+    synced less than SYNC_INTERVAL seconds ago and nothing local wrote to it.
+    While another thread is pulling a table that has loaded before, readers
+    serve the rows already mirrored instead of waiting.
+    """
+    with _lock:
+        state = _tables[table]
+        now = time.monotonic()
+        if not force and not state["dirty"] and now - state["last_sync"] < SYNC_INTERVAL:
+            return 0
+        loaded = state["last_sync"] > 0
+
+    if not state["sync_lock"].acquire(blocking=force or not loaded):
+        return 0
+    try:
+        with _lock:
+            # Cleared before pulling, so a write that lands mid-pull marks it again
+            state["dirty"] = False
+            since = _since(state["watermark"]) if state["watermark"] else None
+            reconcile = now - state["last_reconcile"] >= RECONCILE_INTERVAL
+
+        try:
+            applied = _pull_changes(table, state, since)
+            if reconcile:
+                _reconcile(table, state)
+        except Exception:
+            mark_dirty(table)
+            raise
+
+        with _lock:
+            state["last_sync"] = now
+            if reconcile:
+                state["last_reconcile"] = now
+        return applied
+    finally:
+        state["sync_lock"].release()
+
+
+def sync_all(force=False):
+    """
+    Syncs every mirrored table. Returns a dict of table -> rows applied.
+    """
+    return {table: sync(table, force=force) for table in MIRRORED_TABLES}
+
+
+def mark_dirty(table):
+    """
+    Called by writers so the next read pulls the change instead of waiting for SYNC_INTERVAL.
+    """
+    with _lock:
+        if table in _tables:
+            _tables[table]["dirty"] = True
+
+
+def discard(table, row_id):
+    """
+    Removes a row deleted through this process right away.
+    """
+    with _lock:
+        if table in _tables:
+            _drop(_tables[table], row_id)
+
+
+def rows(table, client_id=None, **equals):
+    """
+    Returns mirrored rows of a table (synced first), optionally limited to one
+    client and to rows whose fields equal the given values. Rows are unordered.
+    """
+    sync(table)
+    with _lock:
+        state = _tables[table]
+        if client_id is not None:
+            candidates = [state["rows"][i] for i in state["by_client"].get(client_id, ())]
+        else:
+            candidates = list(state["rows"].values())
+
+    if equals:
+        candidates = [r for r in candidates if all(r.get(k) == v for k, v in equals.items())]
+    return candidates
+
+
+def get(table, row_id):
+    """
+    Returns one mirrored row by id, or None.
+    """
+    sync(table)
+    with _lock:
+        return _tables[table]["rows"].get(row_id)
+
+
+def mirror_stats():
+    """
+    Returns row counts and watermarks per table.
+    """
+    with _lock:
+        return {
+            table: {"rows": len(state["rows"]), "watermark": state["watermark"]}
+            for table, state in _tables.items()
+        }
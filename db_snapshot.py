@@ -0,0 +1,88 @@
+# db_snapshot.py
+# Typed, columnar snapshots of sales, tasks, and clients for dashboard analytics.
+
+import pandas as pd
+from db import get_all_sales, get_all_tasks, get_all_clients_with_ids
+
+SALE_STATUSES = ["Open", "Closed", "Unsold", "Void"]
+CLIENT_STATUSES = ["active", "inactive", "Active", "Inactive"]
+LIFECYCLE_STAGES = ["New Lead", "Engaged", "Buyer"]
+
+SALES_COLUMNS = ["id", "client_id", "amount", "status", "date"]
+TASKS_COLUMNS = ["id", "client_id", "due_date", "completed"]
+CLIENTS_COLUMNS = ["id", "name", "status", "lifecycle_stage", "last_contact"]
+
+# The db read cache hands back the same list object until the data changes,
+# so frames are rebuilt only when their source list is replaced.
+_frames = {}
+
+
+def _timestamps(series):
+    """
+    Parses ISO strings to UTC timestamps; unparseable values become NaT.
+    Naive values are written with utcnow() and are treated as UTC.
+    """
+    return pd.to_datetime(series, errors="coerce", utc=True, format="ISO8601")
+
+
+def _build(name, rows, columns, convert):
+    cached = _frames.get(name)
+    if cached and cached[0] is rows:
+        return cached[1]
+
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    frame = convert(frame)
+    _frames[name] = (rows, frame)
+    return frame
+
+
+def _convert_sales(frame):
+    frame["amount"] = pd.to_numeric(frame["amount"], errors="coerce").fillna(0.0).astype("float64")
+    frame["status"] = pd.Categorical(frame["status"], categories=SALE_STATUSES)
+    frame["date"] = _timestamps(frame["date"])
+    return frame
+
+
+def _convert_tasks(frame):
+    frame["due_date"] = frame["due_date"].astype("string[pyarrow]")
+    frame["completed"] = frame["completed"].astype("boolean").fillna(False)
+    return frame
+
+
+def _convert_clients(frame):
+    frame["name"] = frame["name"].astype("string[pyarrow]")
+    frame["status"] = pd.Categorical(frame["status"], categories=CLIENT_STATUSES)
+    frame["lifecycle_stage"] = frame["lifecycle_stage"].fillna("New Lead").astype("string[pyarrow]")
+    frame["last_contact"] = _timestamps(frame["last_contact"])
+    return frame
+
+
+def sales_frame():
+    """
+    Returns (rows, frame) for all sales. Frame row i describes rows[i].
+    """
+    rows = get_all_sales()
+    return rows, _build("sales", rows, SALES_COLUMNS, _convert_sales)
+
+
+def tasks_frame():
+    """
+    Returns (rows, frame) for all tasks. Frame row i describes rows[i].
+    """
+    rows = get_all_tasks()
+    return rows, _build("tasks", rows, TASKS_COLUMNS, _convert_tasks)
+
+
+def clients_frame():
+    """
+    Returns (rows, frame) for all clients. Frame row i describes rows[i].
+    """
+    rows = get_all_clients_with_ids()
+    return rows, _build("clients", rows, CLIENTS_COLUMNS, _convert_clients)
+
+
+def select_rows(rows, frame):
+    """
+    Maps a filtered/sorted frame back to the original row dicts, in frame order.
+    """
+    return [rows[i] for i in frame.index]
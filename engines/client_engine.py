@@ -1,77 +1,299 @@
 # client_engine.py
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import threading
+import time
 from db import (
-    get_client_by_id,
-    get_sales_by_client,
-    get_tasks_by_client,
-    get_notes_by_client,
-    get_room_sketches_by_client
+    get_client_bundle,
+    get_clients_active_since,
+    summary_is_stale,
+    update_client_summary
 )
-import streamlit as st
-from openai import OpenAI
-import json
-
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+from engines import llm_gateway
+from engines.prompt_builder import build_history_section, TOKEN_BUDGET
 
 def gather_client_history(client_id):
-    client_info = get_client_by_id(client_id)
-    sales = get_sales_by_client(client_id)
-    tasks = get_tasks_by_client(client_id)
-    notes = get_notes_by_client(client_id)
-    sketches = get_room_sketches_by_client(client_id)
+    bundle = get_client_bundle(client_id)
 
     return {
-        "client": client_info,
-        "sales": sales,
-        "tasks": tasks,
-        "notes": notes,
-        "sketches": sketches
+        "client": bundle["client"],
+        "sales": bundle["sales"],
+        "tasks": bundle["tasks"],
+        "notes": bundle["notes"],
+        "sketches": bundle["sketches"]
     }
 
-def generate_client_summary(client_data):
-    client_info = client_data.get("client", {})
-    sales = client_data.get("sales", [])
-    tasks = client_data.get("tasks", [])
-    notes = client_data.get("notes", [])
-    sketches = client_data.get("sketches", [])
+# ----------------------------
+# SUMMARIES
+# ----------------------------
 
-    # Build input string
-    prompt = f"""
-You are a CRM assistant helping a furniture salesperson understand their client.
+# A summary is rebuilt from full history at least this often, so incremental
+# updates do not drift from the data.
+FULL_REBUILD_DAYS = 30
+# More new rows than this since the last summary triggers a full rebuild.
+MAX_DELTA_ROWS = 20
 
-Based on the data below, create a clear summary of this client that includes:
-- Their design and room preferences
+# Field that dates each kind of history row, in order of preference.
+HISTORY_TIME_FIELDS = {
+    "notes": ["timestamp"],
+    "sketches": ["created_at"],
+    "sales": ["created_at", "date"],
+    "tasks": ["created_at", "due_date"]
+}
+# Fields holding local wall-clock time (db.add_note stamps notes with datetime.now()).
+LOCAL_TIME_FIELDS = {("notes", "timestamp")}
+
+
+def _parse_time(value, local=False):
+    """
+    Parses an ISO timestamp to a naive UTC datetime, or None. With local=True
+    the wall-clock time is read as this machine's local time, ignoring any offset.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if local:
+        parsed = parsed.replace(tzinfo=None).astimezone(timezone.utc)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _row_time(kind, row):
+    for field in HISTORY_TIME_FIELDS[kind]:
+        if row.get(field):
+            return _parse_time(row[field], local=(kind, field) in LOCAL_TIME_FIELDS)
+    return None
+
+
+def summary_delta(client_data):
+    """
+    Returns the history rows added since the client's summary was last updated,
+    in the same shape as gather_client_history(), or None when a full rebuild
+    is due (no summary yet, last full rebuild too old, or too much new activity).
+    """
+    client_info = client_data.get("client") or {}
+    since = _parse_time(client_info.get("summary_last_updated"))
+    rebuilt = _parse_time(client_info.get("summary_rebuilt_at"))
+    if not client_info.get("client_summary") or not since or not rebuilt:
+        return None
+    if datetime.utcnow() - rebuilt > timedelta(days=FULL_REBUILD_DAYS):
+        return None
+
+    delta = {"client": client_info}
+    for kind in HISTORY_TIME_FIELDS:
+        delta[kind] = [
+            row for row in client_data.get(kind) or []
+            if (_row_time(kind, row) or datetime.min) > since
+        ]
+    if sum(len(delta[kind]) for kind in HISTORY_TIME_FIELDS) > MAX_DELTA_ROWS:
+        return None
+    return delta
+
+
+SUMMARY_SECTIONS = """- Their design and room preferences
 - How they interact (communication style, engagement)
 - Sales behavior (big spender? hesitant shopper?)
 - Suggestions for next steps (follow-up, products, style cues)
-- Preferred follow-up tone (text/email/casual/formal)
+- Preferred follow-up tone (text/email/casual/formal)"""
 
-Only include what's supported by data, and write in a helpful, natural tone.
 
-Client Info:
-{json.dumps(client_info, indent=2)}
+def _summary_messages(client_data, token_budget=TOKEN_BUDGET, previous_summary=None, new_activity=None):
+    if previous_summary:
+        history_text, _ = build_history_section(client_data, budget=token_budget, new_activity=new_activity)
+        prompt = f"""
+You are a CRM assistant helping a furniture salesperson understand their client.
 
-Sales:
-{json.dumps(sales, indent=2)}
+Below is the current summary of this client, followed by their client details,
+sales and task totals, and the notes, room sketches and open tasks added since
+that summary was written. Update the summary so it reflects the new activity,
+keeping these sections:
+{SUMMARY_SECTIONS}
 
-Tasks:
-{json.dumps(tasks, indent=2)}
+Keep everything from the current summary that is still accurate. Only include
+what's supported by data, and write in a helpful, natural tone.
 
-Notes:
-{json.dumps(notes, indent=2)}
+Current Summary:
+{previous_summary}
 
-Sketches:
-{json.dumps(sketches, indent=2)}
+Client Details and New Activity:
+{history_text}
+"""
+    else:
+        history_text, _ = build_history_section(client_data, budget=token_budget)
+        prompt = f"""
+You are a CRM assistant helping a furniture salesperson understand their client.
+
+Based on the data below, create a clear summary of this client that includes:
+{SUMMARY_SECTIONS}
+
+Only include what's supported by data, and write in a helpful, natural tone.
+
+{history_text}
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a smart CRM assistant that summarizes client profiles from their history."},
-            {"role": "user", "content": prompt}
-        ],
+    return [
+        {"role": "system", "content": "You are a smart CRM assistant that summarizes client profiles from their history."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_client_summary(client_data, use_cache=True, token_budget=TOKEN_BUDGET, previous_summary=None, new_activity=None):
+    """
+    Summarizes a client's history. The history is compacted to `token_budget`
+    tokens first; see prompt_builder.prompt_stats() for tokens saved.
+
+    With previous_summary, the previous summary is updated with new_activity
+    (see summary_delta); client_data is still the full history, for the totals.
+    """
+    content = llm_gateway.chat(
+        "client_engine.generate_client_summary",
+        messages=_summary_messages(client_data, token_budget, previous_summary, new_activity),
+        use_cache=use_cache,
         max_tokens=700,
         temperature=0.7
     )
 
-    return response.choices[0].message.content.strip()
\ No newline at end of file
+    return content.strip()
+
+
+def stream_client_summary(client_data, use_cache=True, token_budget=TOKEN_BUDGET, previous_summary=None, new_activity=None):
+    """
+    Streaming generate_client_summary: yields the summary text as it arrives.
+    """
+    yield from llm_gateway.stream_chat(
+        "client_engine.stream_client_summary",
+        messages=_summary_messages(client_data, token_budget, previous_summary, new_activity),
+        use_cache=use_cache,
+        max_tokens=700,
+        temperature=0.7
+    )
+
+
+# ----------------------------
+# BACKGROUND SUMMARY REFRESH
+# ----------------------------
+
+SUMMARY_WORKERS = 2
+# How often the sweeper looks for recently active clients with stale summaries.
+SWEEP_INTERVAL = 15 * 60
+SWEEP_LOOKBACK_HOURS = 24
+
+_summary_pool = None
+_refreshing = set()
+_summary_lock = threading.Lock()
+_sweeper = None
+
+
+def _summary_inputs(history):
+    """
+    Returns (previous_summary, new_activity) for a refresh, or (None, None)
+    when the summary should be rebuilt from full history.
+    """
+    delta = summary_delta(history)
+    if delta is None:
+        return None, None
+    return history["client"]["client_summary"], delta
+
+
+def refresh_client_summary(client_id):
+    """
+    Regenerates and stores a client's summary. Updates the previous summary with
+    only the new activity when possible, and rebuilds from full history otherwise.
+    The summary is dated when the history was read, so activity added while the
+    LLM call runs is picked up by the next refresh.
+    """
+    read_at = datetime.utcnow().isoformat()
+    history = gather_client_history(client_id)
+    if not history["client"]:
+        return None
+
+    previous_summary, new_activity = _summary_inputs(history)
+    summary_text = generate_client_summary(history, previous_summary=previous_summary, new_activity=new_activity)
+    update_client_summary(client_id, summary_text, full_rebuild=previous_summary is None, as_of=read_at)
+    return summary_text
+
+
+def stream_refresh_client_summary(client_id):
+    """
+    Streaming refresh_client_summary: yields the new summary as it arrives and
+    stores it once the stream completes.
+    """
+    read_at = datetime.utcnow().isoformat()
+    history = gather_client_history(client_id)
+    if not history["client"]:
+        return
+
+    previous_summary, new_activity = _summary_inputs(history)
+    parts = []
+    for text in stream_client_summary(history, previous_summary=previous_summary, new_activity=new_activity):
+        parts.append(text)
+        yield text
+    update_client_summary(client_id, "".join(parts).strip(), full_rebuild=previous_summary is None, as_of=read_at)
+
+
+def _refresh_one(client_id):
+    try:
+        refresh_client_summary(client_id)
+    except Exception as e:
+        print(f"Summary refresh failed for client {client_id}: {e}")
+    finally:
+        with _summary_lock:
+            _refreshing.discard(client_id)
+
+
+def enqueue_summary_refresh(client_id):
+    """
+    Queues a summary refresh on the background pool. Returns False if one is
+    already queued or running for this client.
+    """
+    global _summary_pool
+    with _summary_lock:
+        if client_id in _refreshing:
+            return False
+        if _summary_pool is None:
+            _summary_pool = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix="summary-refresh")
+        _refreshing.add(client_id)
+        _summary_pool.submit(_refresh_one, client_id)
+    return True
+
+
+def is_summary_refreshing(client_id):
+    with _summary_lock:
+        return client_id in _refreshing
+
+
+def sweep_stale_summaries(lookback_hours=SWEEP_LOOKBACK_HOURS):
+    """
+    Queues refreshes for clients active in the last `lookback_hours` whose
+    summary is older than their activity. Returns the number queued.
+    """
+    since = (datetime.utcnow() - timedelta(hours=lookback_hours)).isoformat()
+    queued = 0
+    for client_row in get_clients_active_since(since):
+        if summary_is_stale(client_row) and enqueue_summary_refresh(client_row["id"]):
+            queued += 1
+    return queued
+
+
+def _sweep_forever(interval):
+    while True:
+        try:
+            sweep_stale_summaries()
+        except Exception as e:
+            print(f"Summary sweep failed: {e}")
+        time.sleep(interval)
+
+
+def start_summary_sweeper(interval=SWEEP_INTERVAL):
+    """
+    Starts the periodic stale-summary sweep once per process.
+    """
+    global _sweeper
+    with _summary_lock:
+        if _sweeper is None:
+            _sweeper = threading.Thread(target=_sweep_forever, args=(interval,), name="summary-sweeper", daemon=True)
+            _sweeper.start()
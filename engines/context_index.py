@@ -0,0 +1,240 @@
+# context_index.py
+# Vector index over client notes and room sketches, for putting only the most relevant ones in prompts.
+
+from collections import defaultdict
+import math
+import re
+import threading
+import time
+import zlib
+import numpy as np
+import streamlit as st
+from db import get_notes_by_client, get_room_sketches_by_client, get_notes_by_clients, get_room_sketches_by_clients
+
+DIMENSIONS = 2048
+DEFAULT_K = 3
+MAX_CONTEXT_CHARS = 300
+# Seconds before a client is reloaded, to pick up notes written by other processes.
+# Writes through this process update the index straight away.
+SYNC_TTL = 300
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "for", "from", "has", "have", "i",
+    "in", "is", "it", "of", "on", "or", "our", "she", "he", "that", "the", "their", "they",
+    "this", "to", "was", "we", "were", "will", "with", "you", "your"
+}
+
+SKETCH_FIELDS = ["room_type", "dimensions", "layout_notes", "current_furniture", "desired_furniture", "special_considerations"]
+
+
+def _stem(token):
+    return token[:-1] if len(token) > 3 and token.endswith("s") and not token.endswith("ss") else token
+
+
+def _terms(text):
+    tokens = [_stem(t) for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if t not in STOPWORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def hashing_embedder(texts, dimensions=DIMENSIONS):
+    """
+    Embeds texts as L2-normalized hashed bags of words and word pairs, with
+    sublinear term frequency. Needs no model or vocabulary.
+    """
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        counts = defaultdict(int)
+        for term in _terms(text):
+            counts[term] += 1
+        for term, count in counts.items():
+            h = zlib.crc32(term.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            matrix[row, h % dimensions] += sign * (1.0 + math.log(count))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def document_text(kind, row):
+    if kind == "notes":
+        return row.get("content") or ""
+    return ". ".join(str(row[f]) for f in SKETCH_FIELDS if row.get(f))
+
+
+class ContextIndex:
+    """
+    Incrementally maintained vector index over notes and sketches, searched per client.
+
+    embed takes a list of texts and returns an (n, d) array of unit vectors. With
+    idf=True the query is weighted by inverse document frequency per dimension,
+    which suits sparse embedders like hashing_embedder; turn it off for dense ones.
+    """
+
+    def __init__(self, embed=hashing_embedder, idf=True):
+        self.embed = embed
+        self.idf = idf
+        self._lock = threading.RLock()
+        self._vectors = None  # (capacity, d) rows, reused through _free
+        self._free = []
+        self._slots = {}  # (kind, row id) -> slot
+        self._docs = {}  # slot -> {"kind", "id", "client_id", "text", "row"}
+        self._by_client = defaultdict(set)  # client id -> slots
+        self._df = None  # documents with a nonzero value per dimension
+        self._synced = {}  # client id -> time.monotonic() of its last full load
+
+    def __len__(self):
+        return len(self._docs)
+
+    # ----------------------------
+    # MAINTENANCE
+    # ----------------------------
+
+    def _allocate(self, count, dimensions):
+        if self._vectors is None:
+            self._vectors = np.zeros((max(64, count), dimensions), dtype=np.float32)
+            self._df = np.zeros(dimensions, dtype=np.float32)
+            self._free = list(range(len(self._vectors) - 1, -1, -1))
+        while len(self._free) < count:
+            old = len(self._vectors)
+            self._vectors = np.vstack([self._vectors, np.zeros_like(self._vectors)])
+            self._free = list(range(len(self._vectors) - 1, old - 1, -1)) + self._free
+        return [self._free.pop() for _ in range(count)]
+
+    def add(self, kind, rows):
+        """
+        Adds or replaces rows of one kind ("notes" or "sketches"). Rows need id and client_id.
+        """
+        rows = [r for r in rows if r.get("id") is not None]
+        if not rows:
+            return
+        texts = [document_text(kind, r) for r in rows]
+        vectors = np.asarray(self.embed(texts), dtype=np.float32)
+
+        with self._lock:
+            for row in rows:
+                self.remove(kind, row["id"])
+            for slot, row, text, vector in zip(self._allocate(len(rows), vectors.shape[1]), rows, texts, vectors):
+                self._vectors[slot] = vector
+                self._df += vector != 0
+                self._slots[(kind, row["id"])] = slot
+                self._docs[slot] = {"kind": kind, "id": row["id"], "client_id": row["client_id"], "text": text, "row": row}
+                self._by_client[row["client_id"]].add(slot)
+
+    def remove(self, kind, row_id):
+        with self._lock:
+            slot = self._slots.pop((kind, row_id), None)
+            if slot is None:
+                return
+            doc = self._docs.pop(slot)
+            self._by_client[doc["client_id"]].discard(slot)
+            self._df -= self._vectors[slot] != 0
+            self._vectors[slot] = 0
+            self._free.append(slot)
+
+    def sync_client(self, client_id, notes, sketches):
+        """
+        Brings a client's documents in line with their current notes and sketches,
+        embedding only added or changed rows.
+        """
+        with self._lock:
+            for kind, rows in [("notes", notes), ("sketches", sketches)]:
+                current = {r["id"]: r for r in rows or []}
+                existing = {self._docs[s]["id"]: self._docs[s] for s in self._by_client[client_id] if self._docs[s]["kind"] == kind}
+                for row_id in set(existing) - set(current):
+                    self.remove(kind, row_id)
+                changed = [r for rid, r in current.items() if rid not in existing or existing[rid]["text"] != document_text(kind, r)]
+                self.add(kind, changed)
+            self._synced[client_id] = time.monotonic()
+
+    def is_synced(self, client_id, max_age=SYNC_TTL):
+        """
+        True if the client was loaded in full within the last max_age seconds.
+        """
+        synced_at = self._synced.get(client_id)
+        return synced_at is not None and time.monotonic() - synced_at < max_age
+
+    # ----------------------------
+    # QUERY
+    # ----------------------------
+
+    def top_k(self, client_id, query, k=DEFAULT_K, kinds=None, exclude=None):
+        """
+        Returns up to k of the client's documents most similar to query, as
+        (score, doc) pairs, best first. exclude is a set of (kind, id) to skip.
+        """
+        with self._lock:
+            slots = [
+                s for s in self._by_client.get(client_id, ())
+                if (kinds is None or self._docs[s]["kind"] in kinds)
+                and (self._docs[s]["kind"], self._docs[s]["id"]) not in (exclude or ())
+            ]
+            if not slots or not query:
+                return []
+
+            q = np.asarray(self.embed([query]), dtype=np.float32)[0]
+            if self.idf:
+                q = q * (np.log((1 + len(self._docs)) / (1 + self._df)) + 1)
+                norm = np.linalg.norm(q)
+                q = q / norm if norm else q
+
+            scores = self._vectors[slots] @ q
+            order = np.argsort(-scores)[:k]
+            return [(float(scores[i]), self._docs[slots[i]]) for i in order if scores[i] > 0]
+
+
+@st.cache_resource
+def _shared_index():
+    return ContextIndex()
+
+
+def get_context_index():
+    return _shared_index()
+
+
+def relevant_context(client_id, query, k=DEFAULT_K, kinds=None, exclude=None):
+    """
+    The client's k notes/sketches most relevant to query, loading the client
+    into the shared index on first use.
+    """
+    if not client_id:
+        return []
+    index = get_context_index()
+    if not index.is_synced(client_id):
+        index.sync_client(client_id, get_notes_by_client(client_id), get_room_sketches_by_client(client_id))
+    return [doc for _, doc in index.top_k(client_id, query, k=k, kinds=kinds, exclude=exclude)]
+
+
+def preload_context(client_ids, notes_by_client=None, sketches_by_client=None):
+    """
+    Loads clients not yet in the shared index with one batched query per kind,
+    so relevant_context() does not query each client on its own. Pass rows
+    already fetched as client_id -> list dicts to skip those queries.
+    """
+    index = get_context_index()
+    missing = [cid for cid in set(client_ids) if cid and not index.is_synced(cid)]
+    if not missing:
+        return 0
+    if notes_by_client is None:
+        notes_by_client = get_notes_by_clients(missing)
+    if sketches_by_client is None:
+        sketches_by_client = get_room_sketches_by_clients(missing)
+    for client_id in missing:
+        index.sync_client(client_id, notes_by_client.get(client_id, []), sketches_by_client.get(client_id, []))
+    return len(missing)
+
+
+def format_context(docs):
+    """
+    One clipped line per note or sketch, for a prompt.
+    """
+    lines = []
+    for doc in docs:
+        text = " ".join(doc["text"].split())
+        if len(text) > MAX_CONTEXT_CHARS:
+            text = text[:MAX_CONTEXT_CHARS - 1].rstrip() + "…"
+        if doc["kind"] == "notes":
+            label = f"{str(doc['row'].get('timestamp') or '')[:10]} {doc['row'].get('type') or 'note'}".strip()
+        else:
+            label = "sketch"
+        lines.append(f"- [{label}] {text}")
+    return "\n".join(lines)
@@ -0,0 +1,131 @@
+# llm_cache.py
+# Persistent, content-addressed cache for chat completions (SQLite, LRU-bounded, optional TTL).
+# Read and written by llm_gateway.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite")
+MAX_ENTRIES = 5000
+MAX_BYTES = 50 * 1024 * 1024
+# Seconds a cached completion stays valid; None keeps it until evicted.
+DEFAULT_TTL = None
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_initialized = False
+
+
+def _connect():
+    global _initialized
+    if not _initialized:
+        directory = os.path.dirname(CACHE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(CACHE_PATH, timeout=10)
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                expires_at REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS completions_lru ON completions (last_access)")
+        conn.commit()
+        _initialized = True
+    return conn
+
+
+def cache_key(model, messages, **params):
+    """
+    SHA-256 of the model, messages, and generation parameters.
+    """
+    payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """
+    Returns the cached response text for key, or None if missing or expired.
+    """
+    now = time.time()
+    with _lock:
+        conn = _connect()
+        try:
+            row = conn.execute("SELECT response, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row and (row[1] is None or row[1] > now):
+                conn.execute("UPDATE completions SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+                _stats["hits"] += 1
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                conn.commit()
+            _stats["misses"] += 1
+            return None
+        finally:
+            conn.close()
+
+
+def put(key, response, ttl=DEFAULT_TTL):
+    now = time.time()
+    expires_at = now + ttl if ttl else None
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions (key, response, size, created_at, last_access, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now, expires_at)
+            )
+            _evict(conn)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def _evict(conn):
+    """
+    Drops expired entries, then least recently used ones until both size limits hold.
+    """
+    conn.execute("DELETE FROM completions WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+    count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+
+    while count > MAX_ENTRIES or total > MAX_BYTES:
+        batch = max(1, count // 10)
+        rows = conn.execute(
+            "SELECT key, size FROM completions ORDER BY last_access LIMIT ?", (batch,)
+        ).fetchall()
+        conn.executemany("DELETE FROM completions WHERE key = ?", [(r[0],) for r in rows])
+        _stats["evictions"] += len(rows)
+        count -= len(rows)
+        total -= sum(r[1] for r in rows)
+
+
+def clear():
+    with _lock:
+        conn = _connect()
+        try:
+            conn.execute("DELETE FROM completions")
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def cache_stats():
+    with _lock:
+        conn = _connect()
+        try:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        finally:
+            conn.close()
+        return {**_stats, "entries": count, "bytes": total}
@@ -0,0 +1,221 @@
+# llm_gateway.py
+# Single entry point for chat completions: one pooled client, timeouts, retries,
+# rate and concurrency limits, the completion cache, and per-engine metrics.
+
+from collections import defaultdict
+import os
+import threading
+import time
+import httpx
+from openai import OpenAI
+import streamlit as st
+from engines import llm_cache
+from engines.llm_limits import OPENAI_LIMITER, call_with_backoff, estimate_tokens
+
+DEFAULT_MODEL = "gpt-4"
+# Seconds to wait for a response (read) and for a connection.
+TIMEOUT = 60.0
+CONNECT_TIMEOUT = 10.0
+MAX_RETRIES = 4
+# Most requests in flight at once from this process.
+MAX_CONCURRENCY = 8
+
+_backend = None
+_backend_lock = threading.Lock()
+_in_flight = threading.BoundedSemaphore(MAX_CONCURRENCY)
+
+_metrics_lock = threading.Lock()
+_metrics = defaultdict(lambda: {
+    "calls": 0,
+    "cache_hits": 0,
+    "errors": 0,
+    "latency_ms": 0.0,
+    "max_latency_ms": 0.0,
+    "prompt_tokens": 0,
+    "completion_tokens": 0
+})
+
+
+# ----------------------------
+# BACKEND
+# ----------------------------
+
+def _default_backend():
+    """
+    OpenAI client on a pooled, keep-alive HTTP client. Set LLM_BASE_URL (secret
+    or env) to point it at any OpenAI-compatible server, e.g. a local stub.
+    """
+    base_url = st.secrets.get("LLM_BASE_URL") or os.getenv("LLM_BASE_URL")
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=MAX_CONCURRENCY, max_keepalive_connections=MAX_CONCURRENCY),
+        timeout=httpx.Timeout(TIMEOUT, connect=CONNECT_TIMEOUT)
+    )
+    return OpenAI(
+        api_key=st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY", "stub"),
+        base_url=base_url,
+        http_client=http_client,
+        max_retries=0  # retries are handled here, with jitter and rate-limit awareness
+    )
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = _default_backend()
+        return _backend
+
+
+def set_backend(backend):
+    """
+    Replaces the backend. Anything with a chat.completions.create(...) method
+    shaped like the OpenAI client's will do. Pass None to restore the default.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+# ----------------------------
+# METRICS
+# ----------------------------
+
+def _record(engine, latency=None, usage=None, cache_hit=False, error=False):
+    with _metrics_lock:
+        entry = _metrics[engine]
+        entry["calls"] += 1
+        if cache_hit:
+            entry["cache_hits"] += 1
+        if error:
+            entry["errors"] += 1
+        if latency is not None:
+            entry["latency_ms"] += latency * 1000
+            entry["max_latency_ms"] = max(entry["max_latency_ms"], latency * 1000)
+        if usage is not None:
+            entry["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            entry["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+
+def llm_metrics():
+    """
+    Per-engine call counts, cache hits, errors, latency, and token usage.
+    """
+    with _metrics_lock:
+        result = {}
+        for engine, entry in _metrics.items():
+            fetched = entry["calls"] - entry["cache_hits"]
+            result[engine] = {
+                **entry,
+                "avg_latency_ms": round(entry["latency_ms"] / fetched, 1) if fetched else 0.0
+            }
+        return result
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# ----------------------------
+# CALLS
+# ----------------------------
+
+def _acquire(messages, params):
+    prompt_text = "".join(m.get("content") or "" for m in messages)
+    OPENAI_LIMITER.acquire(estimate_tokens(prompt_text, params.get("max_tokens") or 0))
+
+
+def _attempt(messages, **params):
+    """
+    One request. Every attempt, retries included, waits for the rate limiter,
+    and a concurrency slot is held only while the request is being sent.
+    """
+    _acquire(messages, params)
+    with _in_flight:
+        return get_backend().chat.completions.create(messages=messages, **params)
+
+
+def chat(engine, messages, model=DEFAULT_MODEL, use_cache=True, ttl=llm_cache.DEFAULT_TTL, timeout=None, **params):
+    """
+    Returns the text of a chat completion. `engine` names the calling function
+    for metrics. Same model, messages and params are served from the cache
+    unless use_cache=False; fresh results refresh the cache either way.
+    """
+    key = llm_cache.cache_key(model, messages, **params)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _record(engine, cache_hit=True)
+            return cached
+
+    started = time.perf_counter()
+    try:
+        response = call_with_backoff(
+            _attempt,
+            model=model,
+            messages=messages,
+            timeout=timeout or TIMEOUT,
+            retries=MAX_RETRIES,
+            **params
+        )
+    except Exception:
+        _record(engine, time.perf_counter() - started, error=True)
+        raise
+
+    _record(engine, time.perf_counter() - started, usage=getattr(response, "usage", None))
+    content = response.choices[0].message.content
+    if content is not None:
+        llm_cache.put(key, content, ttl=ttl)
+    return content
+
+
+def stream_chat(engine, messages, model=DEFAULT_MODEL, use_cache=True, ttl=llm_cache.DEFAULT_TTL, timeout=None, **params):
+    """
+    Like chat(), but yields the text as it arrives. A cached completion is
+    yielded in one piece; a fresh one is cached once the stream ends. Latency
+    is recorded to the first token.
+    """
+    key = llm_cache.cache_key(model, messages, **params)
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            _record(engine, cache_hit=True)
+            yield cached
+            return
+
+    started = time.perf_counter()
+    first_token = None
+    usage = None
+    parts = []
+    try:
+        stream = call_with_backoff(
+            _attempt,
+            model=model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout or TIMEOUT,
+            retries=MAX_RETRIES,
+            **params
+        )
+        # Closed however the loop ends, including a rerun abandoning the generator,
+        # so the pooled connection goes back right away
+        with stream:
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    parts.append(delta)
+                    yield delta
+    except Exception:
+        _record(engine, time.perf_counter() - started, error=True)
+        raise
+
+    _record(engine, (first_token or time.perf_counter()) - started, usage=usage)
+    if parts:
+        llm_cache.put(key, "".join(parts), ttl=ttl)
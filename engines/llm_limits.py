@@ -0,0 +1,94 @@
+# llm_limits.py
+# Shared request/token rate limiting and retry backoff for OpenAI calls.
+
+import random
+import threading
+import time
+from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+# Account limits for the model used by the engines. Keep a little below the real quota.
+REQUESTS_PER_MINUTE = 60
+TOKENS_PER_MINUTE = 40000
+
+# Errors worth retrying: rate limits, timeouts, dropped connections, and 5xx responses.
+TRANSIENT_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+class RateLimiter:
+    """
+    Thread-safe token buckets for requests per minute and tokens per minute.
+    acquire() blocks until both budgets can cover the call.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.requests = self.request_capacity
+        self.tokens = self.token_capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_limits(self, requests_per_minute, tokens_per_minute):
+        """
+        Changes both budgets, e.g. to give each of several processes a share of the account's.
+        """
+        with self.lock:
+            self._refill()
+            self.request_capacity = float(requests_per_minute)
+            self.token_capacity = float(tokens_per_minute)
+            self.requests = min(self.requests, self.request_capacity)
+            self.tokens = min(self.tokens, self.token_capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        self.requests = min(self.request_capacity, self.requests + elapsed * self.request_capacity / 60)
+        self.tokens = min(self.token_capacity, self.tokens + elapsed * self.token_capacity / 60)
+
+    def acquire(self, tokens=0):
+        tokens = min(float(tokens), self.token_capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self.requests) * 60 / self.request_capacity,
+                    (tokens - self.tokens) * 60 / self.token_capacity
+                )
+            time.sleep(max(wait, 0.01))
+
+
+OPENAI_LIMITER = RateLimiter(REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE)
+
+
+def estimate_tokens(text, max_tokens=0):
+    """
+    Rough prompt + completion token count (about 4 characters per token).
+    """
+    return len(text or "") // 4 + max_tokens
+
+
+def call_with_backoff(func, *args, retries=5, base_delay=1.0, max_delay=30.0, **kwargs):
+    """
+    Calls func, retrying transient errors (429s, timeouts, connection errors,
+    5xx) with jittered exponential backoff. Honors a Retry-After header when
+    the API sends one.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            retry_after = getattr(getattr(e, "response", None), "headers", {}).get("retry-after")
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            time.sleep(delay)
@@ -1,18 +1,9 @@
 # message_engine.py
 
-from templates.followups import FOLLOW_UP_MESSAGES
 from templates.followup_tones import FOLLOW_UP_TONES
-from ai_helper import client  # OpenAI client already initialized in ai_helper.py
-
-def get_template_text(client_type, style):
-    template = FOLLOW_UP_MESSAGES.get(client_type, {}).get(style)
-    if not template:
-        return None
-
-    if isinstance(template, dict):
-        return f"Subject: {template['subject']}\n\n{template['body']}"
-    return template
-
+from engines import llm_gateway
+from engines.template_engine import get_template_text, get_template_key
+from engines.context_index import relevant_context, format_context
 
 def get_tone_instruction(style):
     return FOLLOW_UP_TONES.get(style.lower(), "")
@@ -47,30 +38,85 @@ Write this in a personal, natural voice. Avoid robotic language. Be helpful and
     return prompt
 
 
+NO_TEMPLATE_MESSAGE = "⚠️ No message template found for this type/style."
+
+
+def _followup_messages(lifecycle_stage, followup_type, message_style, client_data, sketch_data=None, custom_prompt=None):
+    """
+    Chat messages for a follow-up, or None if there is no template for the stage/style.
+    """
+    template_text = get_template_text(get_template_key(lifecycle_stage), message_style)
+    tone_instruction = get_tone_instruction(message_style)
+
+    if not template_text:
+        return None
+
+    prompt = generate_message_prompt(template_text, client_data, sketch_data, tone_instruction)
+    if followup_type:
+        prompt += f"\nFocus of this follow-up: {followup_type}\n"
+    if custom_prompt:
+        prompt += f"Also mention: {custom_prompt}\n"
+
+    # Only the few notes/sketches most related to this follow-up, not the whole history
+    query = " ".join(str(v) for v in [
+        followup_type, custom_prompt, client_data.get("rooms"), client_data.get("style"),
+        (sketch_data or {}).get("desired_furniture")
+    ] if v)
+    context = relevant_context(client_data.get("id"), query)
+    if context:
+        prompt += f"\nRelevant notes about this client:\n{format_context(context)}\n"
+
+    return [
+        {"role": "system", "content": "You are a helpful assistant for a furniture sales company."},
+        {"role": "user", "content": prompt}
+    ]
+
+
 def generate_followup_message(
     lifecycle_stage,
     followup_type,
     message_style,
     client_data,
     sketch_data=None,
-    custom_prompt=None
+    custom_prompt=None,
+    use_cache=True
 ):
-    template_text = get_template_text(client_type, style)
-    tone_instruction = get_tone_instruction(style)
+    messages = _followup_messages(lifecycle_stage, followup_type, message_style, client_data, sketch_data, custom_prompt)
+    if not messages:
+        return NO_TEMPLATE_MESSAGE
+
+    content = llm_gateway.chat(
+        "message_engine.generate_followup_message",
+        messages=messages,
+        use_cache=use_cache,
+        max_tokens=400,
+        temperature=0.8
+    )
 
-    if not template_text:
-        return "⚠️ No message template found for this type/style."
+    return content.strip()
 
-    prompt = generate_message_prompt(template_text, client_data, sketch_data, tone_instruction)
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant for a furniture sales company."},
-            {"role": "user", "content": prompt}
-        ],
+def stream_followup_message(
+    lifecycle_stage,
+    followup_type,
+    message_style,
+    client_data,
+    sketch_data=None,
+    custom_prompt=None,
+    use_cache=True
+):
+    """
+    Streaming generate_followup_message: yields the message text as it arrives.
+    """
+    messages = _followup_messages(lifecycle_stage, followup_type, message_style, client_data, sketch_data, custom_prompt)
+    if not messages:
+        yield NO_TEMPLATE_MESSAGE
+        return
+
+    yield from llm_gateway.stream_chat(
+        "message_engine.stream_followup_message",
+        messages=messages,
+        use_cache=use_cache,
         max_tokens=400,
         temperature=0.8
     )
-
-    return response.choices[0].message.content.strip()
@@ -0,0 +1,212 @@
+# prompt_builder.py
+# Compacts a client's history into a token-budgeted prompt section.
+
+import re
+import threading
+from datetime import datetime
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+# Token budget for the history section of a summary prompt.
+TOKEN_BUDGET = 1500
+MAX_NOTE_CHARS = 400
+MAX_RECENT_SALES = 5
+MAX_OPEN_TASKS = 5
+# prompt_stats() measures both the raw and the compacted history as characters // 4,
+# so the savings are approximate but in one unit. Budgets use count_tokens().
+CHARS_PER_TOKEN = 4
+
+CLIENT_FIELDS = ["name", "status", "lifecycle_stage", "rooms", "style", "budget", "last_contact"]
+SKETCH_FIELDS = ["room_type", "dimensions", "current_furniture", "desired_furniture", "layout_notes", "special_considerations"]
+
+_stats_lock = threading.Lock()
+_stats = {"calls": 0, "raw_tokens": 0, "prompt_tokens": 0, "tokens_saved": 0, "last": None}
+
+
+def count_tokens(text):
+    """
+    Token count for text. Uses tiktoken when installed, otherwise approximates
+    BPE by counting words, numbers, and punctuation runs.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    count = 0
+    for piece in re.findall(r"\w+|[^\w\s]+", text):
+        count += max(1, -(-len(piece) // 6)) if piece[0].isalnum() or piece[0] == "_" else len(piece)
+    return count
+
+
+def _clip(text, limit):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _fields(row, names):
+    """
+    "field: value" pairs for the named fields that have a value.
+    """
+    parts = []
+    for name in names:
+        value = row.get(name)
+        if value not in (None, "", [], {}):
+            parts.append(f"{name.replace('_', ' ')}: {_clip(value, MAX_NOTE_CHARS)}")
+    return "; ".join(parts)
+
+
+def _day(value):
+    return str(value)[:10] if value else "?"
+
+
+def _sales_section(sales):
+    if not sales:
+        return ["Sales: none"]
+
+    totals = {}
+    for sale in sales:
+        status = sale.get("status") or "Unknown"
+        count, amount = totals.get(status, (0, 0.0))
+        totals[status] = (count + 1, amount + float(sale.get("amount") or 0))
+
+    dated = sorted((s for s in sales if s.get("date")), key=lambda s: s["date"])
+    lines = ["Sales: " + ", ".join(f"{status} {count} (${amount:,.0f})" for status, (count, amount) in totals.items())]
+    if dated:
+        lines.append(f"First sale {_day(dated[0]['date'])}, latest {_day(dated[-1]['date'])}")
+    for sale in dated[::-1][:MAX_RECENT_SALES]:
+        line = f"- {_day(sale['date'])} {sale.get('status')} ${float(sale.get('amount') or 0):,.0f}"
+        if sale.get("notes"):
+            line += f": {_clip(sale['notes'], 160)}"
+        lines.append(line)
+    return lines
+
+
+def _open_task_lines(tasks):
+    """
+    Open tasks, soonest due first.
+    """
+    open_tasks = sorted((t for t in tasks if not t.get("completed")), key=lambda t: t.get("due_date") or "")
+    return [
+        f"- due {_day(task.get('due_date'))}: {_clip(task.get('description') or task.get('title') or '', 160)}"
+        for task in open_tasks[:MAX_OPEN_TASKS]
+    ]
+
+
+def _note_lines(notes):
+    """
+    Notes newest first, one clipped line each.
+    """
+    ordered = sorted(notes, key=lambda n: n.get("timestamp") or "", reverse=True)
+    return [
+        f"- {_day(note.get('timestamp'))} [{note.get('type') or 'note'}] {_clip(note['content'], MAX_NOTE_CHARS)}"
+        for note in ordered if note.get("content")
+    ]
+
+
+def _sketch_lines(sketches):
+    return [f"- {_fields(sketch, SKETCH_FIELDS)}" for sketch in sketches[::-1] if _fields(sketch, SKETCH_FIELDS)]
+
+
+def _json_chars(value, depth=1):
+    """
+    Approximate length of json.dumps(value, indent=2), without building the string.
+    """
+    indent = 2 * depth + 2  # indentation plus ",\n"
+    closing = 2 * depth - 2 if value else 0
+    if isinstance(value, dict):
+        return 2 + closing + sum(indent + len(str(k)) + 4 + _json_chars(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 2 + closing + sum(indent + _json_chars(v, depth + 1) for v in value)
+    if isinstance(value, str):
+        return len(value) + 2
+    return len(str(value))
+
+
+def estimate_raw_tokens(history):
+    """
+    Approximate tokens of the uncompacted history summaries used to embed (the
+    sections as indented JSON), for measuring savings.
+    """
+    keys = [("Client Info", "client"), ("Sales", "sales"), ("Tasks", "tasks"), ("Notes", "notes"), ("Sketches", "sketches")]
+    chars = sum(len(label) + 3 + _json_chars(history.get(key) or ([] if key != "client" else {})) for label, key in keys)
+    return chars // CHARS_PER_TOKEN
+
+
+def build_history_section(history, budget=TOKEN_BUDGET, new_activity=None):
+    """
+    Renders a client's history as compact text within `budget` tokens.
+
+    Client fields, sales aggregates, and task counts are always kept. Notes
+    (newest first), sketches, then open tasks fill the remaining budget line
+    by line; whatever does not fit is counted in an "omitted" line. Returns
+    (text, stats).
+
+    With new_activity (rows in the same shape as history), the kept lines
+    still describe the full history but only the new notes, sketches, and open
+    tasks are listed.
+    """
+    listed = new_activity if new_activity is not None else history
+    client = history.get("client") or {}
+    lines = ["Client: " + (_fields(client, CLIENT_FIELDS) or "no details")]
+    lines += _sales_section(history.get("sales") or [])
+    tasks = history.get("tasks") or []
+    open_count = sum(1 for t in tasks if not t.get("completed"))
+    lines.append(f"Tasks: {open_count} open, {len(tasks) - open_count} completed")
+    used = count_tokens("\n".join(lines))
+
+    omitted = {}
+    optional = [
+        ("Notes (newest first):", "notes", _note_lines(listed.get("notes") or [])),
+        ("Room sketches:", "sketches", _sketch_lines(listed.get("sketches") or [])),
+        ("Open tasks:", "tasks", _open_task_lines(listed.get("tasks") or []))
+    ]
+    for header, key, items in optional:
+        section = []
+        for i, line in enumerate(items):
+            cost = count_tokens(line) + 1
+            if not section:
+                cost += count_tokens(header) + 1
+            if used + cost > budget:
+                omitted[key] = len(items) - i
+                break
+            if not section:
+                section.append(header)
+            section.append(line)
+            used += cost
+        lines += section
+
+    if omitted:
+        lines.append("Omitted for length: " + ", ".join(f"{count} {key}" for key, count in omitted.items()))
+
+    text = "\n".join(lines)
+    stats = {
+        "raw_tokens": estimate_raw_tokens(history),
+        "prompt_tokens": len(text) // CHARS_PER_TOKEN,
+        "budget": budget,
+        "omitted": omitted,
+        "at": datetime.utcnow().isoformat()
+    }
+    stats["tokens_saved"] = max(0, stats["raw_tokens"] - stats["prompt_tokens"])
+    _record(stats)
+    return text, stats
+
+
+def _record(stats):
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["raw_tokens"] += stats["raw_tokens"]
+        _stats["prompt_tokens"] += stats["prompt_tokens"]
+        _stats["tokens_saved"] += stats["tokens_saved"]
+        _stats["last"] = stats
+
+
+def prompt_stats():
+    """
+    Totals across all compacted prompts in this process, plus the latest call.
+    """
+    with _stats_lock:
+        return dict(_stats)
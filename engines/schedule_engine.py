@@ -0,0 +1,96 @@
+# schedule_engine.py
+# Materializes FOLLOW_UP_PLANS into dated follow-up occurrences per client.
+
+from datetime import date, datetime, timedelta
+from db import (
+    get_sales_by_client,
+    replace_followup_schedule,
+    iter_rows
+)
+from templates.followup_plan import FOLLOW_UP_PLANS
+
+# Sales that drive follow-ups.
+SCHEDULED_STATUSES = ["Open", "Closed"]
+# New occurrences this many days in the past are still added, so a missed run can catch up.
+# Pending entries already in the schedule are kept however old they are.
+CATCH_UP_DAYS = 7
+LONG_TERM_AFTER_DAYS = 365
+
+
+def _sale_date(sale):
+    return datetime.fromisoformat(sale["date"]).date()
+
+
+def plan_type_on(first_sale_date, day):
+    """
+    The follow-up plan a client with sales is on for a given day.
+    """
+    return "long_term" if (day - first_sale_date).days >= LONG_TERM_AFTER_DAYS else "buyer"
+
+
+def compute_occurrences(client_id, sales):
+    """
+    Returns every follow-up occurrence implied by a client's sales: client-level
+    steps counted from the first sale, and sale-level steps counted from each
+    sale. A step only applies if the client is on that step's plan on its due date.
+    Descriptions are the plan step's; the order amount is added by the task engine.
+    """
+    scheduled = [s for s in sales if s["status"] in SCHEDULED_STATUSES and s.get("date")]
+    if not scheduled:
+        return []
+
+    first_sale = min(_sale_date(s) for s in scheduled)
+    occurrences = []
+
+    def occurrence(plan_type, step_index, step, due, sale_id=None):
+        return {
+            "client_id": client_id,
+            "sale_id": sale_id,
+            "plan_type": plan_type,
+            "step": step_index,
+            "description": step["description"],
+            "due_date": due.isoformat()
+        }
+
+    for plan_type in ["buyer", "long_term"]:
+        for step_index, step in enumerate(FOLLOW_UP_PLANS.get(plan_type, [])):
+            offset = timedelta(days=step["days_after"])
+
+            # --- 1. Client-Level ---
+            due = first_sale + offset
+            if step["days_after"] and plan_type_on(first_sale, due) == plan_type:
+                occurrences.append(occurrence(plan_type, step_index, step, due))
+
+            # --- 2. Sale-Level ---
+            for sale in scheduled:
+                due = _sale_date(sale) + offset
+                if plan_type_on(first_sale, due) == plan_type:
+                    occurrences.append(occurrence(plan_type, step_index, step, due, sale_id=sale["id"]))
+
+    return occurrences
+
+
+def refresh_followup_schedule(client_id, sales=None):
+    """
+    Recomputes a client's pending follow-up schedule from their current sales.
+    Returns the number of pending occurrences stored.
+    """
+    if sales is None:
+        sales = get_sales_by_client(client_id)
+
+    cutoff = (date.today() - timedelta(days=CATCH_UP_DAYS)).isoformat()
+    return replace_followup_schedule(client_id, compute_occurrences(client_id, sales), insert_from=cutoff)
+
+
+def rebuild_all_schedules():
+    """
+    Materializes the schedule for every client that has sales. Used once after
+    adding the followup_schedule table, or after FOLLOW_UP_PLANS changes.
+    """
+    sales_by_client = {}
+    for sale in iter_rows("sales", columns="id, client_id, amount, status, date"):
+        sales_by_client.setdefault(sale["client_id"], []).append(sale)
+
+    for client_id, sales in sales_by_client.items():
+        refresh_followup_schedule(client_id, sales)
+    return len(sales_by_client)
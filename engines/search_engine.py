@@ -0,0 +1,202 @@
+# search_engine.py
+# In-memory client search for the pickers: phone digits, name prefixes, trigram fuzzy matching.
+
+from collections import defaultdict
+import re
+import threading
+import streamlit as st
+from db import get_all_clients_with_ids, search_clients as search_clients_server
+
+# Minimum trigram similarity for a fuzzy (typo-tolerant) name match.
+FUZZY_THRESHOLD = 0.2
+# Longest name prefix indexed per token.
+MAX_PREFIX = 12
+DEFAULT_LIMIT = 25
+
+
+def normalize_name(text):
+    return " ".join(re.findall(r"[a-z0-9]+", (text or "").lower()))
+
+
+def phone_digits(text):
+    return re.sub(r"\D", "", text or "")
+
+
+def client_label(client):
+    return f"{client['name']} ({client['phone']})"
+
+
+def trigrams(text):
+    """
+    Trigrams of each word, padded like pg_trgm so short words and word starts still match.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def _word_similarity(query_words, doc_words):
+    """
+    Average, over query words, of the best trigram similarity to any name word.
+    """
+    if not doc_words:
+        return 0.0
+    best = [max(_jaccard(q, d) for d in doc_words) for q in query_words]
+    return sum(best) / len(best)
+
+
+class ClientSearchIndex:
+    """
+    Incrementally maintained search index over client names and phones.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}  # client_id -> {"label", "name", "digits", "grams", "word_grams", "source"}
+        self._grams = defaultdict(set)  # name trigram -> client ids
+        self._prefixes = defaultdict(set)  # name token prefix -> client ids
+        self._digit_grams = defaultdict(set)  # phone digit trigram -> client ids
+        self.label_to_id = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def labels(self):
+        return list(self.label_to_id.keys())
+
+    # ----------------------------
+    # MAINTENANCE
+    # ----------------------------
+
+    def add(self, client):
+        """
+        Adds or replaces one client (needs id, name, phone).
+        """
+        with self._lock:
+            self.remove(client["id"])
+
+            name = normalize_name(client.get("name"))
+            digits = phone_digits(client.get("phone"))
+            doc = {
+                "label": client_label(client),
+                "name": name,
+                "digits": digits,
+                "grams": trigrams(name),
+                "word_grams": [trigrams(word) for word in name.split()],
+                "source": (client.get("name"), client.get("phone"))
+            }
+            self._docs[client["id"]] = doc
+            self.label_to_id[doc["label"]] = client["id"]
+
+            for gram in doc["grams"]:
+                self._grams[gram].add(client["id"])
+            for token in name.split():
+                for i in range(1, min(len(token), MAX_PREFIX) + 1):
+                    self._prefixes[token[:i]].add(client["id"])
+            for i in range(len(digits) - 2):
+                self._digit_grams[digits[i:i + 3]].add(client["id"])
+
+    def remove(self, client_id):
+        with self._lock:
+            doc = self._docs.pop(client_id, None)
+            if not doc:
+                return
+            if self.label_to_id.get(doc["label"]) == client_id:
+                del self.label_to_id[doc["label"]]
+            for gram in doc["grams"]:
+                self._grams[gram].discard(client_id)
+            for token in doc["name"].split():
+                for i in range(1, min(len(token), MAX_PREFIX) + 1):
+                    self._prefixes[token[:i]].discard(client_id)
+            for i in range(len(doc["digits"]) - 2):
+                self._digit_grams[doc["digits"][i:i + 3]].discard(client_id)
+
+    def sync(self, clients):
+        """
+        Brings the index in line with a client list, touching only added, changed, or removed clients.
+        """
+        with self._lock:
+            seen = set()
+            for client in clients:
+                seen.add(client["id"])
+                doc = self._docs.get(client["id"])
+                if not doc or doc["source"] != (client.get("name"), client.get("phone")):
+                    self.add(client)
+            for client_id in set(self._docs) - seen:
+                self.remove(client_id)
+
+    # ----------------------------
+    # QUERY
+    # ----------------------------
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Returns up to `limit` (client_id, label, score) tuples, best match first.
+        """
+        name_query = normalize_name(query)
+        digit_query = phone_digits(query)
+        scores = defaultdict(float)
+
+        with self._lock:
+            # Phone: any run of 3+ digits, formatting ignored
+            if len(digit_query) >= 3:
+                candidates = set.intersection(*(
+                    self._digit_grams.get(digit_query[i:i + 3], set())
+                    for i in range(len(digit_query) - 2)
+                ))
+                for client_id in candidates:
+                    digits = self._docs[client_id]["digits"]
+                    if digit_query in digits:
+                        scores[client_id] += 4.0 if digits.endswith(digit_query) or digits.startswith(digit_query) else 3.0
+
+            tokens = name_query.split()
+            if tokens:
+                # Name: every query word is a prefix of some name word
+                prefix_sets = [self._prefixes.get(t[:MAX_PREFIX], set()) for t in tokens]
+                for client_id in set.intersection(*prefix_sets):
+                    name = self._docs[client_id]["name"]
+                    scores[client_id] += 3.0 if name.startswith(name_query) else 2.5
+
+                # Fuzzy: per-word trigram similarity tolerates typos
+                query_words = [trigrams(t) for t in tokens]
+                candidates = set()
+                for grams in query_words:
+                    for gram in grams:
+                        candidates |= self._grams.get(gram, set())
+                for client_id in candidates:
+                    similarity = _word_similarity(query_words, self._docs[client_id]["word_grams"])
+                    if similarity >= FUZZY_THRESHOLD:
+                        scores[client_id] += 2.0 * similarity
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self._docs[item[0]]["label"]))
+            return [(cid, self._docs[cid]["label"], round(score, 3)) for cid, score in ranked[:limit]]
+
+
+@st.cache_resource
+def _shared_index():
+    return ClientSearchIndex()
+
+
+def get_client_search_index():
+    """
+    Returns the process-wide index, synced incrementally with the current client list.
+    """
+    index = _shared_index()
+    index.sync(get_all_clients_with_ids(columns="client_label"))
+    return index
+
+
+def search_clients(query, limit=DEFAULT_LIMIT, server=False):
+    """
+    Ranked client search. With server=True the query runs in Postgres (ilike on
+    name and phone) instead of the local index. Returns (client_id, label, score) tuples.
+    """
+    if server:
+        return [(c["id"], client_label(c), 1.0) for c in search_clients_server(query, limit=limit)]
+    return get_client_search_index().search(query, limit=limit)
@@ -1,11 +1,8 @@
 # sketch_engine.py
 
-from openai import OpenAI
-import streamlit as st
+from engines import llm_gateway
 
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
-
-def generate_sketch_summary(sketch_data, client_data=None):
+def _sketch_messages(sketch_data, client_data=None):
     prompt = f"""
 You are a professional interior designer helping a furniture consultant understand a room's layout and potential based on client input.
 
@@ -26,14 +23,30 @@ Please summarize the key characteristics of this room, and provide helpful desig
 Keep the tone collaborative, brief, and helpful for a sales/design discussion.
 """
 
-    response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {"role": "system", "content": "You are a skilled furniture layout and style advisor."},
-            {"role": "user", "content": prompt}
-        ],
+    return [
+        {"role": "system", "content": "You are a skilled furniture layout and style advisor."},
+        {"role": "user", "content": prompt}
+    ]
+
+def generate_sketch_summary(sketch_data, client_data=None, use_cache=True):
+    content = llm_gateway.chat(
+        "sketch_engine.generate_sketch_summary",
+        messages=_sketch_messages(sketch_data, client_data),
+        use_cache=use_cache,
         max_tokens=400,
         temperature=0.7
     )
 
-    return response.choices[0].message.content.strip()
+    return content.strip()
+
+def stream_sketch_summary(sketch_data, client_data=None, use_cache=True):
+    """
+    Streaming generate_sketch_summary: yields the summary text as it arrives.
+    """
+    yield from llm_gateway.stream_chat(
+        "sketch_engine.stream_sketch_summary",
+        messages=_sketch_messages(sketch_data, client_data),
+        use_cache=use_cache,
+        max_tokens=400,
+        temperature=0.7
+    )
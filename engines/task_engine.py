@@ -1,85 +1,267 @@
 # task_engine.py
 
-from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
+import threading
 from db import (
-    get_active_clients,
-    get_sales_by_client,
-    get_last_task_date,
-    add_task,
+    iter_due_followups,
+    get_clients_by_ids,
+    get_room_sketches_by_clients,
+    get_notes_by_clients,
+    get_sales_by_ids,
     get_client_by_id,
-    get_room_sketches_by_client
+    get_room_sketch_by_id,
+    mark_followups_emitted,
+    add_tasks,
+    save_task_message
 )
-from templates.followup_plan import FOLLOW_UP_PLANS
 from engines.message_engine import generate_followup_message
+from engines.context_index import preload_context
+from engines.template_engine import render_followup
 
-def get_days_since_first_sale(sales):
-    if not sales:
+# Schedule entries processed per batch (batches never split a client). A checkpoint is recorded after each batch.
+CHUNK_SIZE = 200
+# Follow-up messages generated in parallel.
+MESSAGE_WORKERS = 8
+# Tasks are written as soon as this many messages have finished.
+FLUSH_SIZE = 25
+# How task messages are produced:
+#   fast - filled in from the local follow-up templates during the run (no API calls)
+#   lazy - generated by the LLM the first time someone opens the task
+#   llm  - generated by the LLM during the run
+# fast and lazy tasks keep a message_spec so the message can be personalized on demand.
+MESSAGE_TIERS = ["fast", "lazy", "llm"]
+MESSAGE_TIER = "fast"
+
+
+def _batches_by_client(rows, size):
+    """
+    Groups schedule rows (ordered by client) into batches of about `size`,
+    cutting only between clients so a checkpointed client is always complete.
+    """
+    batch = []
+    for row in rows:
+        if len(batch) >= size and row["client_id"] != batch[-1]["client_id"]:
+            yield batch
+            batch = []
+        batch.append(row)
+    if batch:
+        yield batch
+
+
+def task_description(entry, sale=None):
+    """
+    A schedule entry's description, with the order amount for sale-level steps.
+    """
+    if sale is None:
+        return entry["description"]
+    return f"{entry['description']} (Order ${sale['amount']})"
+
+
+def build_task(entry, client, latest_sketch, tier=MESSAGE_TIER, sale=None):
+    """
+    Turns a due schedule entry into a task (see MESSAGE_TIERS). fast tasks get a
+    rendered template message, lazy tasks get their text on first open
+    (ensure_task_message), and llm tasks carry message_args for generation
+    during the run. sale is the entry's sale, for its current amount.
+    """
+    description = task_description(entry, sale)
+    task = {
+        "client_id": entry["client_id"],
+        "sale_id": entry.get("sale_id"),
+        "description": description,
+        "due_date": entry["due_date"],
+        "title": description[:50],
+        "message": None,
+        "schedule_id": entry["id"]
+    }
+
+    if tier in ["fast", "lazy"]:
+        task["message_spec"] = {
+            "plan_type": entry["plan_type"],
+            "style": "text",
+            "sketch_id": latest_sketch.get("id")
+        }
+        if tier == "fast":
+            task["message"] = render_followup(entry["plan_type"], "text", client, latest_sketch)
+    else:
+        task["message_args"] = {
+            "lifecycle_stage": entry["plan_type"],
+            "followup_type": entry["description"],
+            "message_style": "text",
+            "client_data": client,
+            "sketch_data": latest_sketch
+        }
+    return task
+
+
+def _generate_message(message_args):
+    # Rate limits, retries, and the concurrency cap are applied by llm_gateway
+    return generate_followup_message(**message_args)
+
+
+def _write(tasks):
+    written = add_tasks(tasks)
+    mark_followups_emitted(t.get("schedule_id") for t in tasks)
+    return written
+
+
+def write_tasks_with_messages(tasks, pool):
+    """
+    Generates messages for tasks on the worker pool and writes the tasks in
+    batches of FLUSH_SIZE as their messages complete, so finished work is saved
+    even if the run stops partway. A task whose message fails is still written,
+    without a message. Returns the number of tasks written.
+    """
+    futures = {pool.submit(_generate_message, task.pop("message_args")): task for task in tasks}
+    ready = []
+    written = 0
+
+    for future in as_completed(futures):
+        task = futures[future]
+        try:
+            task["message"] = future.result()
+        except Exception as e:
+            print(f"Message generation failed for client {task['client_id']}: {e}")
+        ready.append(task)
+
+        if len(ready) >= FLUSH_SIZE:
+            written += _write(ready)
+            ready = []
+
+    if ready:
+        written += _write(ready)
+    return written
+
+
+# ----------------------------
+# LAZY MESSAGES
+# ----------------------------
+
+def message_args_from_spec(task):
+    spec = task["message_spec"]
+    sketch = get_room_sketch_by_id(spec["sketch_id"]) if spec.get("sketch_id") else None
+    return {
+        "lifecycle_stage": spec["plan_type"],
+        "followup_type": task["description"],
+        "message_style": spec.get("style", "text"),
+        "client_data": get_client_by_id(task["client_id"]),
+        "sketch_data": sketch or {}
+    }
+
+
+def ensure_task_message(task):
+    """
+    Returns the task's message, generating and storing it first if the task was
+    created with only a message_spec. Returns None for tasks with neither.
+    """
+    if task.get("message"):
+        return task["message"]
+    if not task.get("message_spec"):
         return None
-    first_sale = min(s["date"] for s in sales if s["status"] in ["Closed", "Open"])
-    days = (date.today() - datetime.fromisoformat(first_sale).date()).days
-    return days
-
-
-def get_followup_type(client_data, sales):
-    if not sales:
-        return "shopper"
-    days_since = get_days_since_first_sale(sales)
-    return "long_term" if days_since and days_since >= 365 else "buyer"
-
-
-def has_task_for_today(client_id, description):
-    last_task_date = get_last_task_date(client_id)
-    return last_task_date == date.today().isoformat()
-
-
-def run_daily_task_generator():
-    active_clients = get_active_clients()
-
-    for client in active_clients:
-        client_id = client["id"]
-        sales = get_sales_by_client(client_id)
-        client_data = get_client_by_id(client_id)
-        sketches = get_room_sketches_by_client(client_id)
-        latest_sketch = sketches[-1] if sketches else {}
-
-        plan_type = get_followup_type(client, sales)
-        plan = FOLLOW_UP_PLANS.get(plan_type, [])
-
-        # --- 1. Client-Level Tasks ---
-        client_days = get_days_since_first_sale(sales)
-        if client_days:
-            for step in plan:
-                if step["days_after"] == client_days:
-                    desc = step["description"]
-
-                    if has_task_for_today(client_id, desc):
-                        continue
-
-                    message = generate_followup_message(
-                        client_type=plan_type,
-                        style="text",
-                        client_data=client_data,
-                        sketch_data=latest_sketch
-                    )
-
-                    add_task(client_id, desc, date.today().isoformat(), message=message, title=desc[:50])
-
-        # --- 2. Sale-Level Tasks ---
-        for sale in sales:
-            if sale["status"] in ["Open", "Closed"]:
-                sale_days = (date.today() - datetime.fromisoformat(sale["date"]).date()).days
-                for step in plan:
-                    if step["days_after"] == sale_days:
-                        desc = f"{step['description']} (Order ${sale['amount']})"
-
-                        if has_task_for_today(client_id, desc):  # prevent duplication
-                            continue
-
-                        message = generate_followup_message(
-                            client_type=plan_type,
-                            style="text",
-                            client_data=client_data,
-                            sketch_data=latest_sketch
-                        )
-
-                        add_task(client_id, desc, date.today().isoformat(), message, sale_id=sale["id"])
+
+    message = _generate_message(message_args_from_spec(task))
+    return save_task_message(task["id"], message)
+
+
+def personalize_task_message(task):
+    """
+    Replaces a task's message with one written by the LLM from its message_spec.
+    Skips the completion cache, so asking again gives a fresh draft. Returns the new message.
+    """
+    message = _generate_message({**message_args_from_spec(task), "use_cache": False})
+    return save_task_message(task["id"], message, overwrite=True)
+
+
+_prefetch_pool = None
+_prefetching = set()
+_prefetch_lock = threading.Lock()
+
+
+def _prefetch_batch(tasks):
+    try:
+        preload_context(task["client_id"] for task in tasks)
+    except Exception as e:
+        print(f"Context preload failed: {e}")
+    for task in tasks:
+        _prefetch_pool.submit(_prefetch_one, task)
+
+
+def _prefetch_one(task):
+    try:
+        ensure_task_message(task)
+    except Exception as e:
+        print(f"Message prefetch failed for task {task['id']}: {e}")
+    finally:
+        with _prefetch_lock:
+            _prefetching.discard(task["id"])
+
+
+def prefetch_task_messages(tasks):
+    """
+    Generates missing messages for the given tasks on a background pool, without
+    blocking the caller. Tasks already being prefetched are skipped. Their
+    clients' notes and sketches are loaded into the context index in one batch
+    before the messages are generated. Returns the number of tasks queued.
+    """
+    global _prefetch_pool
+    batch = []
+    with _prefetch_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=MESSAGE_WORKERS, thread_name_prefix="message-prefetch")
+        for task in tasks:
+            if task.get("message") or not task.get("message_spec") or task["id"] in _prefetching:
+                continue
+            _prefetching.add(task["id"])
+            batch.append(task)
+        if batch:
+            _prefetch_pool.submit(_prefetch_batch, batch)
+    return len(batch)
+
+
+def run_daily_task_generator(min_id=None, max_id=None, resume_after=None, on_checkpoint=None, chunk_size=CHUNK_SIZE, message_tier=MESSAGE_TIER):
+    """
+    Emits tasks for every follow-up schedule entry due on or before today that
+    has not been emitted yet, so days the job did not run are caught up.
+    Optionally limited to a client id range. fast and lazy tasks are written
+    straight away; with the llm tier messages are generated concurrently under
+    the shared OpenAI rate limits and tasks are written as their messages
+    finish. After each batch on_checkpoint is called with (last client id,
+    tasks written so far). Returns the number of tasks written.
+    """
+    today = date.today().isoformat()
+    due_entries = iter_due_followups(today, min_client_id=min_id, max_client_id=max_id, after_client_id=resume_after)
+    written = 0
+
+    with ThreadPoolExecutor(max_workers=MESSAGE_WORKERS) as pool:
+        for batch in _batches_by_client(due_entries, chunk_size):
+            client_ids = {entry["client_id"] for entry in batch}
+            clients = get_clients_by_ids(client_ids)
+            active_ids = [cid for cid in client_ids if cid in clients]
+            sketches = get_room_sketches_by_clients(active_ids)
+            if message_tier == "llm":
+                # Prompts pull the most relevant notes; load the batch into the index up front
+                preload_context(active_ids, notes_by_client=get_notes_by_clients(active_ids), sketches_by_client=sketches)
+            sales = get_sales_by_ids((entry.get("sale_id") for entry in batch), columns="id, amount")
+
+            tasks = []
+            skipped = []
+            for entry in batch:
+                client = clients.get(entry["client_id"])
+                if not client or client.get("status") != "Active":
+                    skipped.append(entry["id"])  # inactive clients don't get follow-ups
+                    continue
+                tasks.append(build_task(
+                    entry, client, (sketches.get(entry["client_id"]) or [{}])[-1],
+                    tier=message_tier, sale=sales.get(entry.get("sale_id"))
+                ))
+
+            mark_followups_emitted(skipped)
+            if message_tier == "llm":
+                written += write_tasks_with_messages(tasks, pool)
+            else:
+                written += _write(tasks)
+            if on_checkpoint:
+                on_checkpoint(batch[-1]["client_id"], written)
+
+    return written
@@ -0,0 +1,99 @@
+# template_engine.py
+# Renders FOLLOW_UP_MESSAGES locally: placeholders are filled from client and sketch data, no LLM call.
+
+from string import Formatter
+import streamlit as st
+from templates.followups import FOLLOW_UP_MESSAGES
+
+# Signs {your_name} in templates.
+SENDER_NAME = st.secrets.get("SENDER_NAME", "The Design Team")
+
+
+def _first_name(client_data, sketch_data):
+    name = (client_data.get("name") or "").strip()
+    return name.split()[0] if name else "there"
+
+
+def _product_or_room(client_data, sketch_data):
+    for value in [sketch_data.get("desired_furniture"), sketch_data.get("room_type"), client_data.get("rooms")]:
+        if value and str(value).strip():
+            return str(value).strip()
+    return "space"
+
+
+def _sender(client_data, sketch_data):
+    return SENDER_NAME
+
+
+# Placeholder -> function(client_data, sketch_data) returning its value.
+FIELD_RESOLVERS = {
+    "name": _first_name,
+    "product_or_room": _product_or_room,
+    "your_name": _sender
+}
+
+
+def get_template_text(client_type, style):
+    template = FOLLOW_UP_MESSAGES.get(client_type, {}).get(style)
+    if not template:
+        return None
+
+    if isinstance(template, dict):
+        return f"Subject: {template['subject']}\n\n{template['body']}"
+    return template
+
+
+def get_template_key(lifecycle_stage):
+    """
+    Maps a lifecycle stage or follow-up plan type onto the template sets in FOLLOW_UP_MESSAGES.
+    """
+    if lifecycle_stage in FOLLOW_UP_MESSAGES:
+        return lifecycle_stage
+    return "bought" if str(lifecycle_stage).lower() in ["buyer", "long_term"] else "browsed"
+
+
+def _compile(template_text, where):
+    """
+    Splits a template into (literal, field) pieces. Raises ValueError for a
+    placeholder with no resolver or a malformed one.
+    """
+    pieces = []
+    for literal, field, format_spec, conversion in Formatter().parse(template_text):
+        if field is not None and (field not in FIELD_RESOLVERS or format_spec or conversion):
+            raise ValueError(f"Follow-up template {where} has unsupported placeholder {{{field}}}")
+        pieces.append((literal, field))
+    return pieces
+
+
+def _compile_all():
+    compiled = {}
+    for client_type, styles in FOLLOW_UP_MESSAGES.items():
+        for style in styles:
+            compiled[(client_type, style)] = _compile(get_template_text(client_type, style), f"{client_type}/{style}")
+    return compiled
+
+
+# Compiled once at import, so a bad template fails at startup instead of mid-run.
+COMPILED_TEMPLATES = _compile_all()
+
+
+def render_followup(lifecycle_stage, message_style, client_data, sketch_data=None):
+    """
+    Fills the follow-up template for a stage and style from client and sketch
+    data. Returns None if there is no template for that combination.
+    """
+    pieces = COMPILED_TEMPLATES.get((get_template_key(lifecycle_stage), message_style))
+    if pieces is None:
+        return None
+
+    client_data = client_data or {}
+    sketch_data = sketch_data or {}
+    values = {}
+    parts = []
+    for literal, field in pieces:
+        parts.append(literal)
+        if field is not None:
+            if field not in values:
+                values[field] = FIELD_RESOLVERS[field](client_data, sketch_data)
+            parts.append(values[field])
+    return "".join(parts)
@@ -1,84 +1,126 @@
 import streamlit as st
+import profiler
 from datetime import date, datetime
-from db import get_all_tasks, complete_task, get_client_by_id
+from db import get_open_tasks, get_tasks_page, get_task_messages, complete_task, complete_tasks, get_client_names_by_ids
+from components.task_message import task_message
 
 # --- Page Setup ---
 st.set_page_config(page_title="Tasks", page_icon="📋", layout="wide")
-st.title("📋 The Task Manager")
-
-# --- Fetch Tasks ---
-tasks = get_all_tasks()
-
-# Separate tasks
-today = date.today().isoformat()
-
-open_tasks = [t for t in tasks if not t["completed"]]
-completed_tasks = [t for t in tasks if t["completed"]]
-
-overdue_tasks = [t for t in open_tasks if t["due_date"] < today]
-today_tasks = [t for t in open_tasks if t["due_date"] == today]
-upcoming_tasks = [t for t in open_tasks if t["due_date"] > today]
+with profiler.page("Task Manager"):
+    st.title("📋 The Task Manager")
+
+    COMPLETED_PAGE_SIZE = 25
+
+    # --- Fetch Tasks ---
+    profiler.section("Fetch Tasks")
+    # Open tasks are streamed in full; completed tasks are loaded one window at a time.
+    open_tasks = get_open_tasks(columns="task_row")
+
+    if "completed_pages" not in st.session_state:
+        st.session_state.completed_pages = 1
+
+    completed_tasks = []
+    cursor = None
+    for _ in range(st.session_state.completed_pages):
+        page, cursor = get_tasks_page(after=cursor, page_size=COMPLETED_PAGE_SIZE, completed=True, desc=True, columns="task_row")
+        completed_tasks.extend(page)
+        if cursor is None:
+            break
+    has_more_completed = cursor is not None
+
+    # Separate tasks
+    today = date.today().isoformat()
+
+    overdue_tasks = [t for t in open_tasks if t["due_date"] < today]
+    today_tasks = [t for t in open_tasks if t["due_date"] == today]
+    upcoming_tasks = [t for t in open_tasks if t["due_date"] > today]
+
+    # Message bodies are only shown for today's tasks, so fetch just those
+    today_messages = get_task_messages(t["id"] for t in today_tasks)
+
+    # Resolve every client name shown on this page in one query
+    client_names = get_client_names_by_ids(t["client_id"] for t in open_tasks + completed_tasks)
+
+    # --- Bulk Complete ---
+    profiler.section("Bulk Complete")
+    if open_tasks:
+        with st.expander("☑️ Bulk Complete Tasks"):
+            with st.form("bulk_complete_form", clear_on_submit=True):
+                task_labels = {
+                    f"{t['description']} — {client_names.get(t['client_id'], 'Unknown Client')} (Due {t['due_date']}) (#{t['id']})": t["id"]
+                    for t in open_tasks
+                }
+                selected_labels = st.multiselect("Select tasks to mark done", list(task_labels.keys()))
+                bulk_complete = st.form_submit_button("✅ Mark Selected Done")
+
+                if bulk_complete and selected_labels:
+                    done = complete_tasks(task_labels[label] for label in selected_labels)
+                    st.success(f"{done} tasks marked complete.")
+                    st.rerun()
+
+    # --- Today's Tasks ---
+    profiler.section("Today's Tasks")
+    st.subheader("🟡 Tasks Due Today")
+
+    if today_tasks:
+        for task in today_tasks:
+            client_name = client_names.get(task["client_id"], "Unknown Client")
+
+            with st.container():
+                st.markdown(f"**{task['description']}** — {client_name}")
+                task_message(task, "today", message=today_messages.get(task["id"]))
+                if st.checkbox(f"Mark Done", key=f"today_task_{task['id']}"):
+                    complete_task(task["id"])
+                    st.success("Task marked complete.")
+                    st.rerun()
+    else:
+        st.info("🎉 No tasks due today!")
+
+    # --- Upcoming Tasks ---
+    profiler.section("Upcoming Tasks")
+    st.subheader("🟢 Upcoming Tasks")
+
+    if upcoming_tasks:
+        for task in upcoming_tasks:
+            client_name = client_names.get(task["client_id"], "Unknown Client")
+
+            with st.container():
+                st.markdown(f"**{task['description']}** — Due {task['due_date']} — {client_name}")
+                if st.checkbox(f"Mark Done", key=f"upcoming_task_{task['id']}"):
+                    complete_task(task["id"])
+                    st.success("Task marked complete.")
+                    st.rerun()
+    else:
+        st.info("No upcoming tasks.")
+
+    # --- Overdue Tasks ---
+    profiler.section("Overdue Tasks")
+    st.subheader("🔴 Overdue Tasks")
+
+    if overdue_tasks:
+        for task in overdue_tasks:
+            client_name = client_names.get(task["client_id"], "Unknown Client")
+
+            with st.container():
+                st.markdown(f"**{task['description']}** — Overdue since {task['due_date']} — {client_name}")
+                if st.checkbox(f"Mark Done", key=f"overdue_task_{task['id']}"):
+                    complete_task(task["id"])
+                    st.success("Task marked complete.")
+                    st.rerun()
+    else:
+        st.success("No overdue tasks! 🔥")
 
-# --- Today's Tasks ---
-st.subheader("🟡 Tasks Due Today")
+    # --- Completed Tasks ---
+    profiler.section("Completed Tasks")
+    with st.expander("✅ Completed Tasks (Click to View)"):
+        if completed_tasks:
+            for task in completed_tasks:  # already ordered most recent first
+                client_name = client_names.get(task["client_id"], "Unknown Client")
 
-if today_tasks:
-    for task in today_tasks:
-        client_info = get_client_by_id(task["client_id"])
-        client_name = client_info["name"] if client_info else "Unknown Client"
+                st.markdown(f"- {task['description']} — Done for {client_name} on {task['due_date']}")
 
-        with st.container():
-            st.markdown(f"**{task['description']}** — {client_name}")
-            if task.get("message"):
-                st.caption(f"💬 {task['message']}")
-            if st.checkbox(f"Mark Done", key=f"today_task_{task['id']}"):
-                complete_task(task["id"])
-                st.success("Task marked complete.")
-                st.rerun()
-else:
-    st.info("🎉 No tasks due today!")
-
-# --- Upcoming Tasks ---
-st.subheader("🟢 Upcoming Tasks")
-
-if upcoming_tasks:
-    for task in upcoming_tasks:
-        client_info = get_client_by_id(task["client_id"])
-        client_name = client_info["name"] if client_info else "Unknown Client"
-
-        with st.container():
-            st.markdown(f"**{task['description']}** — Due {task['due_date']} — {client_name}")
-            if st.checkbox(f"Mark Done", key=f"upcoming_task_{task['id']}"):
-                complete_task(task["id"])
-                st.success("Task marked complete.")
-                st.rerun()
-else:
-    st.info("No upcoming tasks.")
-
-# --- Overdue Tasks ---
-st.subheader("🔴 Overdue Tasks")
-
-if overdue_tasks:
-    for task in overdue_tasks:
-        client_info = get_client_by_id(task["client_id"])
-        client_name = client_info["name"] if client_info else "Unknown Client"
-
-        with st.container():
-            st.markdown(f"**{task['description']}** — Overdue since {task['due_date']} — {client_name}")
-            if st.checkbox(f"Mark Done", key=f"overdue_task_{task['id']}"):
-                complete_task(task["id"])
-                st.success("Task marked complete.")
+            if has_more_completed and st.button("⬇️ Load More Completed Tasks"):
+                st.session_state.completed_pages += 1
                 st.rerun()
-else:
-    st.success("No overdue tasks! 🔥")
-
-# --- Completed Tasks ---
-with st.expander("✅ Completed Tasks (Click to View)"):
-    if completed_tasks:
-        for task in completed_tasks[::-1]:  # show most recent completed first
-            client_info = get_client_by_id(task["client_id"])
-            client_name = client_info["name"] if client_info else "Unknown Client"
-
-            st.markdown(f"- {task['description']} — Done for {client_name} on {task['due_date']}")
-    else:
-        st.info("No completed tasks yet.")
+        else:
+            st.info("No completed tasks yet.")
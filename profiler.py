@@ -0,0 +1,308 @@
+# profiler.py
+# Per-section render profiling for the pages: times and counts db/engine calls, flags N+1 patterns.
+#
+# Enable with PROFILE_PAGES = true in secrets (or PROFILE_PAGES=1 in the environment).
+# The modules in INSTRUMENTED_MODULES are wrapped when this module is imported, so
+# pages import it first; they run their body inside `with profiler.page(name):`
+# after set_page_config and call section() at each section.
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import importlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import streamlit as st
+
+PROFILE = bool(st.secrets.get("PROFILE_PAGES", False)) or os.getenv("PROFILE_PAGES") == "1"
+PROFILE_LOG = os.getenv("PROFILE_LOG", ".cache/profile.jsonl")
+# Calls to one function with this many different arguments in one section look like N+1.
+N_PLUS_ONE_THRESHOLD = 5
+SLOWEST_CALLS = 10
+
+# Modules whose public functions are timed.
+INSTRUMENTED_MODULES = [
+    "db",
+    "db_async",
+    "db_dashboard",
+    "db_snapshot",
+    "ai_helper",
+    "engines.client_engine",
+    "engines.context_index",
+    "engines.llm_gateway",
+    "engines.message_engine",
+    "engines.prompt_builder",
+    "engines.schedule_engine",
+    "engines.search_engine",
+    "engines.sketch_engine",
+    "engines.task_engine",
+    "engines.template_engine"
+]
+
+# Module name prefix -> call kind shown in the breakdown.
+KINDS = {"db": "db", "engines.llm_gateway": "llm"}
+
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def _kind(module_name):
+    for prefix, kind in KINDS.items():
+        if module_name == prefix or module_name.startswith(prefix + "_"):
+            return kind
+    return "engine"
+
+
+def _run():
+    return getattr(_local, "run", None)
+
+
+# ----------------------------
+# INSTRUMENTATION
+# ----------------------------
+
+def _record(name, kind, args, kwargs, started, depth):
+    run = _run()
+    run["calls"].append({
+        "name": name,
+        "kind": kind,
+        "section": run["section"],
+        "depth": depth,
+        "ms": (time.perf_counter() - started) * 1000,
+        "args": repr((args, sorted(kwargs.items())))[:200]
+    })
+
+
+def _wrap(func, name, kind):
+    def enter():
+        run = _run()
+        if run is None:
+            return None
+        run["depth"] += 1
+        return run["depth"] - 1
+
+    def leave(depth, args, kwargs, started):
+        if _run() is None:
+            return  # the run finished while a generator was still open
+        _run()["depth"] = depth
+        _record(name, kind, args, kwargs, started, depth)
+
+    if inspect.isgeneratorfunction(func):
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            depth = enter()
+            if depth is None:
+                yield from func(*args, **kwargs)
+                return
+            started = time.perf_counter()
+            try:
+                yield from func(*args, **kwargs)
+            finally:
+                leave(depth, args, kwargs, started)
+        return generator_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            depth = enter()
+            if depth is None:
+                return await func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                leave(depth, args, kwargs, started)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        depth = enter()
+        if depth is None:
+            return func(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            leave(depth, args, kwargs, started)
+    return wrapper
+
+
+def instrument_module(module_name):
+    """
+    Wraps the public functions defined in a module with timers. Returns a dict
+    of original function -> wrapper.
+    """
+    module = sys.modules[module_name]
+    short_name = module_name.split(".")[-1]
+    kind = _kind(module_name)
+    wrapped = {}
+    for attr, value in list(vars(module).items()):
+        if attr.startswith("_") or not inspect.isfunction(value) or value.__module__ != module_name:
+            continue
+        wrapped[value] = _wrap(value, f"{short_name}.{attr}", kind)
+        setattr(module, attr, wrapped[value])
+    return wrapped
+
+
+def instrument_all(module_names=INSTRUMENTED_MODULES):
+    """
+    Imports and wraps every listed module, then rebinds the names they imported
+    from one another, so calls between them are timed too.
+    """
+    modules = [importlib.import_module(name) for name in module_names]
+    wrapped = {}
+    for module in modules:
+        wrapped.update(instrument_module(module.__name__))
+    for module in modules:
+        for attr, value in list(vars(module).items()):
+            if inspect.isfunction(value) and value in wrapped:
+                setattr(module, attr, wrapped[value])
+
+
+# ----------------------------
+# RUNS
+# ----------------------------
+
+def start_run(page):
+    """
+    Starts profiling one rerun of a page script.
+    """
+    if not PROFILE:
+        return
+    now = time.perf_counter()
+    _local.run = {
+        "page": page,
+        "section": "Page setup",
+        "section_started": now,
+        "sections": [],
+        "calls": [],
+        "depth": 0
+    }
+
+
+def _close_section(run, now):
+    run["sections"].append({"section": run["section"], "wall_ms": (now - run["section_started"]) * 1000})
+
+
+def section(name):
+    """
+    Attributes everything until the next section() to `name`.
+    """
+    run = _run()
+    if run is None:
+        return
+    now = time.perf_counter()
+    _close_section(run, now)
+    run["section"] = name
+    run["section_started"] = now
+
+
+def _n_plus_one(calls):
+    """
+    (section, function, calls, distinct argument sets) for functions called
+    repeatedly with different arguments within one section.
+    """
+    seen = defaultdict(list)
+    for call in calls:
+        seen[(call["section"], call["name"])].append(call["args"])
+    return [
+        {"section": sec, "name": name, "calls": len(args), "distinct_args": len(set(args))}
+        for (sec, name), args in seen.items()
+        if len(set(args)) >= N_PLUS_ONE_THRESHOLD
+    ]
+
+
+def summarize(run):
+    """
+    Per-section wall time, top-level call counts and time by kind, LLM calls at
+    any depth, N+1 suspects, and the slowest calls.
+    """
+    breakdown = {}
+    for sec in run["sections"]:
+        entry = breakdown.setdefault(sec["section"], {"section": sec["section"], "wall_ms": 0.0, "llm_calls": 0})
+        entry["wall_ms"] += sec["wall_ms"]
+
+    for call in run["calls"]:
+        entry = breakdown.setdefault(call["section"], {"section": call["section"], "wall_ms": 0.0, "llm_calls": 0})
+        if call["kind"] == "llm":
+            entry["llm_calls"] += 1
+        if call["depth"] == 0:
+            entry[f"{call['kind']}_calls"] = entry.get(f"{call['kind']}_calls", 0) + 1
+            entry[f"{call['kind']}_ms"] = entry.get(f"{call['kind']}_ms", 0.0) + call["ms"]
+
+    slowest = sorted((c for c in run["calls"] if c["depth"] == 0), key=lambda c: -c["ms"])[:SLOWEST_CALLS]
+    return {
+        "page": run["page"],
+        "at": datetime.utcnow().isoformat(),
+        "total_ms": sum(s["wall_ms"] for s in run["sections"]),
+        "sections": [
+            {k: round(v, 1) if isinstance(v, float) else v for k, v in entry.items()}
+            for entry in breakdown.values()
+        ],
+        "n_plus_one": _n_plus_one(run["calls"]),
+        "slowest": [{"name": c["name"], "section": c["section"], "ms": round(c["ms"], 1)} for c in slowest]
+    }
+
+
+def _append_log(summary):
+    directory = os.path.dirname(PROFILE_LOG)
+    with _log_lock:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(PROFILE_LOG, "a") as f:
+            f.write(json.dumps(summary) + "\n")
+
+
+def finish_run(render=True):
+    """
+    Ends the rerun: appends its summary to PROFILE_LOG and, with render=True,
+    renders the debug panel.
+    """
+    run = _run()
+    if run is None:
+        return
+    _close_section(run, time.perf_counter())
+    _local.run = None
+
+    summary = summarize(run)
+    try:
+        _append_log(summary)
+    except OSError as e:
+        print(f"Could not write profile log: {e}")
+
+    if not render:
+        return
+    with st.expander(f"🐞 Profiler — {summary['total_ms']:.0f} ms", expanded=False):
+        st.dataframe(summary["sections"], use_container_width=True, hide_index=True)
+        for suspect in summary["n_plus_one"]:
+            st.warning(
+                f"Possible N+1 in **{suspect['section']}**: `{suspect['name']}` called "
+                f"{suspect['calls']} times with {suspect['distinct_args']} different arguments."
+            )
+        st.markdown("**Slowest calls**")
+        st.dataframe(summary["slowest"], use_container_width=True, hide_index=True)
+
+
+@contextmanager
+def page(name):
+    """
+    Profiles one rerun of a page script around its body. st.rerun() and
+    st.switch_page() end the script by raising, so those reruns are still
+    logged, just without the panel.
+    """
+    start_run(name)
+    try:
+        yield
+    except BaseException:
+        finish_run(render=False)
+        raise
+    finish_run()
+
+
+if PROFILE:
+    instrument_all()